@@ -1,8 +1,12 @@
 import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
-import sqlite3
 import os
+import io
+import csv
+import importlib.util
+import qs_data
+from qs_data import INDICATORS, DB_PATH
 
 # Page configuration
 st.set_page_config(
@@ -17,65 +21,207 @@ st.title("🎓 QS World University Rankings Dashboard")
 # Add some space between title and mode selector
 st.markdown("<br>", unsafe_allow_html=True)
 
-# Data loading
-@st.cache_data
-def load_data():
-    # Check if database file exists
-    db_path = "data/qs_rankings.db"
-    if not os.path.exists(db_path):
-        st.error("Database file not found. Please run the import script first.")
-        return pd.DataFrame()
-    
-    # Connect to database
-    conn = sqlite3.connect(db_path)
-    
-    # Read data
-    df = pd.read_sql_query("SELECT * FROM qs_rankings", conn)
-    conn.close()
-    
-    return df
+# Optional time-to-live in seconds for cached data (e.g. QS_CACHE_TTL=3600);
+# unset means entries live until the database snapshot changes
+CACHE_TTL = float(os.environ["QS_CACHE_TTL"]) if os.environ.get("QS_CACHE_TTL") else None
+
+# Built once per snapshot and process; the previous snapshot's dataset is released when a new one loads.
+# Queries go through the dataset (qs_data), which memoizes its own results.
+@st.cache_resource(max_entries=1, ttl=CACHE_TTL)
+def get_dataset(snapshot_id):
+    return qs_data.load_dataset(DB_PATH, snapshot_id=snapshot_id)
+
+def get_avg_score(summary):
+    return round(summary.mean_total_score, 2) if summary.mean_total_score is not None else None
 
-def safe_float(val):
-    try:
-        return float(val) if val is not None and val != '' else None
-    except (ValueError, TypeError):
+def get_school_count(summary):
+    return summary.count
+
+def choose_university(input_text, year=None, key=None):
+    # The one university the input refers to (among those ranked in the given year); an ambiguous
+    # input such as "University of California" offers a choice between its matches, best ranked
+    # (in that year, or else in the latest year) first
+    match = dataset.resolve(input_text, year)
+    if match is not None:
+        return match
+    choices = dataset.search_names(input_text, 10, year)
+    if len(choices) <= 1:
+        return choices[0] if choices else None
+    rank_year = year if year is not None else dataset.years[-1]
+    choices = sorted(choices, key=lambda choice: dataset.rank_positions.get((choice.univ_id, rank_year), len(dataset.univ_names)))
+    return st.selectbox(
+        f"Several universities match \"{input_text.strip()}\":",
+        choices,
+        format_func=lambda choice: choice.name,
+        key=key
+    )
+
+def resolve_school(input_text, year, box_name):
+    # Row of the one university the input refers to in the given year, with a warning when no
+    # university ranked that year matches
+    match = choose_university(input_text, year, key=f'choice_{box_name}')
+    if match is None:
+        st.warning(f"❌ {box_name}: no university ranked in {year} matches \"{input_text.strip()}\"")
         return None
+    return dataset.university_row(match.univ_id, year)
+
+def show_suggestions(input_text, box_name):
+    if len(input_text.strip()) >= 2:
+        suggestions = [match.name for match in dataset.search_names(input_text, 3)]
+        if suggestions:
+            st.markdown(f'<div style="color: #666; font-size: 0.8em; margin-left: 10px; margin-bottom: 5px;"><strong>{box_name} suggestions:</strong></div>', unsafe_allow_html=True)
+            for i, suggestion in enumerate(suggestions, 1):
+                st.markdown(f'<div style="color: #888; font-size: 0.75em; margin-left: 20px;">{i}. {suggestion}</div>', unsafe_allow_html=True)
 
-def get_avg_score(df):
-    scores = df['TOTAL_SCORE'].apply(safe_float)
-    valid_scores = scores.dropna()
-    return round(valid_scores.mean(), 2) if not valid_scores.empty else None
+def read_batch_file(uploaded, has_header=True):
+    # First column of an uploaded list: one name or university id per line (.txt), per row (.csv)
+    # or per row of the first sheet (.xlsx); with has_header, the first row of a .csv/.xlsx is a column title
+    if uploaded.name.lower().endswith(".xlsx"):
+        column = pd.read_excel(uploaded, header=None, dtype=str).iloc[:, 0]
+        return column.iloc[1 if has_header else 0:].dropna().tolist()
+    text = uploaded.getvalue().decode("utf-8-sig")
+    if uploaded.name.lower().endswith(".csv"):
+        rows = list(csv.reader(io.StringIO(text)))
+        return [row[0] for row in rows[1 if has_header else 0:] if row]
+    return text.splitlines()
 
-def get_school_count(df):
-    return len(df)
+# Leaderboard statistics: label -> column of the importer's country_stats / region_stats tables
+LEADERBOARD_STATS = {
+    "Mean": "MEAN", "Median": "MEDIAN", "Max": "MAX", "Min": "MIN",
+    "25th Percentile": "P25", "75th Percentile": "P75"
+}
 
-# Load data
-df = load_data()
+def group_scores(values):
+    # Indicator scores of a group row; indicators nobody in the group reports count as 0
+    return {score_col: round(values[score_col], 2) if pd.notna(values[score_col]) else 0 for _, score_col, _ in INDICATORS}
 
-if df.empty:
-    st.stop()
+def replace_text(df, values):
+    # Placeholder text for missing text cells; typed score/rank columns keep their own missing values
+    text_cols = [col for col in df.columns if not pd.api.types.is_numeric_dtype(df[col])]
+    return df.assign(**{col: df[col].replace(values) for col in text_cols})
+
+# Result tables are paged and sorted server-side: only the current page of the selected columns
+# is rendered and sent to the browser, however broad the filter
+PAGE_SIZES = [25, 50, 100, 200]
+# Table column -> column to sort on (banded ranks sort by their lower bound)
+SORT_COLUMNS = {"RANK": "RANK_LO"}
+
+def table_columns(base_cols, indicators, display_mode):
+    # Columns of a result table and their display headers for the selected indicators and display mode
+    cols = list(base_cols)
+    col_rename = {
+        "RANK": "Rank", "NAME": "Name", "COUNTRY": "Country", "YEAR": "Year", "TOTAL_SCORE": "Total Score"
+    }
+    for ind, score_col, rank_col in INDICATORS:
+        if ind in indicators:
+            if display_mode == "Score":
+                cols += [score_col]
+            elif display_mode == "Rank":
+                cols += [rank_col]
+            else:  # Both
+                cols += [score_col, rank_col]
+            col_rename[score_col] = f"{ind} Score"
+            col_rename[rank_col] = f"{ind} Rank"
+    return cols, {col: col_rename[col] for col in cols}
+
+def render_table(df, cols, col_rename, sort_col, ascending, page, page_size, placeholders, rank_ordered=False):
+    rows = qs_data.page_rows(df, SORT_COLUMNS.get(sort_col, sort_col), ascending, page, page_size, rank_ordered)
+    show_df = rows[cols].rename(columns=col_rename)
+    show_df = replace_text(show_df, placeholders)
+    # Row numbers continue across pages and start from 1
+    show_df.index = range((page - 1) * page_size + 1, (page - 1) * page_size + len(show_df) + 1)
+    return show_df
+
+def table_controls(key, col_rename, default_sort, default_ascending, total_rows):
+    # Sort column, order and page for a result table; returns (sort_col, ascending, page, page_size)
+    headers = list(col_rename.values())
+    columns = list(col_rename.keys())
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        sort_header = st.selectbox("Sort by", headers, index=columns.index(default_sort), key=f'{key}_sort')
+    with col2:
+        order = st.radio("Order", ["Ascending", "Descending"], index=0 if default_ascending else 1,
+                         horizontal=True, key=f'{key}_order')
+    with col3:
+        page_size = st.selectbox("Rows per page", PAGE_SIZES, index=1, key=f'{key}_page_size')
+    pages = max(1, -(-total_rows // page_size))
+    with col4:
+        # Keyed on the page count and sort, so a narrower filter never keeps an out-of-range page
+        # and a new sort starts from the first page
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, step=1,
+                               key=f'{key}_page_{pages}_{sort_header}_{order}')
+    return columns[headers.index(sort_header)], order == "Ascending", int(page), page_size
+
+# Filter Mode table page for one full filter combination; popular combinations are served from memory
+@st.cache_data(max_entries=128, ttl=CACHE_TTL)
+def render_filter_table(snapshot_id, year, regions, countries, indicators, display_mode,
+                        sort_col, ascending, page, page_size):
+    filtered = get_dataset(snapshot_id).filter_by(year, regions, countries)
+    cols, col_rename = table_columns(["RANK", "NAME", "COUNTRY", "YEAR", "TOTAL_SCORE"], indicators, display_mode)
+    # filter_by returns rank order, so the default Rank sort reads pages without re-sorting
+    return render_table(filtered, cols, col_rename, sort_col, ascending, page, page_size, {None: "None", "": "None"},
+                        rank_ordered=True)
+
+# Download formats: label -> (file extension, MIME type); Parquet needs pyarrow
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "XLSX": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+if importlib.util.find_spec("pyarrow") is not None:
+    EXPORT_FORMATS["Parquet"] = ("parquet", "application/vnd.apache.parquet")
+
+# File contents of a displayed table, built in memory once per snapshot, query and format.
+# The table itself is not hashed (leading underscore): the query identifies it.
+@st.cache_data(max_entries=64, ttl=CACHE_TTL)
+def export_table(snapshot_id, query, file_format, _df):
+    buffer = io.BytesIO()
+    if file_format == "CSV":
+        buffer.write(_df.to_csv(index=False).encode("utf-8-sig"))
+    elif file_format == "Parquet":
+        # Columns mixing numbers and placeholders ("-", "None") are written as text
+        mixed = {col: str for col in _df.columns if _df[col].dtype == object}
+        _df.astype(mixed).to_parquet(buffer, index=False)
+    else:
+        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+            _df.to_excel(writer, sheet_name='Comparison', index=False)
+    return buffer.getvalue()
+
+def download_table(df, file_name, query, key):
+    # Format picker and download button serving the table straight from memory
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        file_format = st.selectbox("Format", list(EXPORT_FORMATS), key=f'{key}_format', label_visibility="collapsed")
+    extension, mime = EXPORT_FORMATS[file_format]
+    with col2:
+        st.download_button(
+            "📊 Download",
+            data=export_table(snapshot_id, query, file_format, df),
+            file_name=f"{file_name}.{extension}",
+            mime=mime,
+            key=key
+        )
+
+# Manual refresh: drop every cached result and reload from the current database file
+with st.sidebar:
+    if st.button("🔄 Reload data", help="Clear cached data and reload it from the database."):
+        st.cache_data.clear()
+        qs_data.read_snapshot_id.cache_clear()
+        get_dataset.clear()
 
-# Data preprocessing
-df['TOTAL_SCORE'] = df['TOTAL_SCORE'].apply(safe_float)
-
-# Indicator definitions
-INDICATORS = [
-    ("Academic Reputation", "AR_SCORE", "AR_RANK"),
-    ("Employer Reputation", "ER_SCORE", "ER_RANK"),
-    ("Faculty Student", "FSR_SCORE", "FSR_RANK"),
-    ("Citations per Faculty", "CPF_SCORE", "CPF_RANK"),
-    ("International Faculty", "IFR_SCORE", "IFR_RANK"),
-    ("International Students", "ISR_SCORE", "ISR_RANK"),
-    ("International Students Diversity", "ISD_SCORE", "ISD_RANK"),
-    ("International Research Network", "IRN_SCORE", "IRN_RANK"),
-    ("Employment Outcomes", "EO_SCORE", "EO_RANK"),
-    ("Sustainability", "SUS_SCORE", "SUS_RANK")
-]
+# Load the shared dataset (no per-rerun preprocessing)
+snapshot_id = qs_data.get_snapshot_id(DB_PATH)
+with st.sidebar:
+    st.caption(f"Data snapshot: {snapshot_id or 'unknown'}")
+dataset = get_dataset(snapshot_id)
+
+if dataset.empty:
+    st.error("Database file not found. Please run the import script first.")
+    st.stop()
 
 # Get option data
-years = sorted(df['YEAR'].unique())
-regions = sorted(df['REGION'].dropna().unique())
-countries = sorted(df['COUNTRY'].dropna().unique())
+years = dataset.years
+regions = dataset.regions
+countries = dataset.countries
 indicator_options = [ind[0] for ind in INDICATORS]
 
 # Set default values
@@ -95,14 +241,17 @@ if 'compare_schools' not in st.session_state:
     st.session_state['compare_schools'] = ['', '', '', '']
 if 'compare_year' not in st.session_state:
     st.session_state['compare_year'] = years[-1] if years else 2024
-
-# Auto-complete suggestions
-univ_names = sorted(df['NAME'].dropna().unique())
+if 'benchmark_school' not in st.session_state:
+    st.session_state['benchmark_school'] = ''
+if 'benchmark_year' not in st.session_state:
+    st.session_state['benchmark_year'] = years[-1] if years else 2024
+if 'benchmark_range' not in st.session_state:
+    st.session_state['benchmark_range'] = 30
 
 # Mode switcher
 mode = st.radio(
     "Select Function Mode:",
-    ["Filter Mode", "Search Mode", "Compare Mode"],
+    ["Filter Mode", "Search Mode", "Compare Mode", "Batch Compare Mode", "Benchmark Mode", "Country/Region Leaderboard"],
     horizontal=True,
     key='current_mode'
 )
@@ -123,14 +272,10 @@ if mode == "Filter Mode":
     with col4:
         selected_indicators = st.multiselect("Indicators", indicator_options, default=_default_indicators, key='selected_indicators')
 
-    # Filter data
-    filtered = df[(df['YEAR'] == selected_year) & df['REGION'].isin(selected_regions)]
-    if selected_countries:
-        filtered = filtered[filtered['COUNTRY'].isin(selected_countries)]
-
-    # Statistics
-    school_count = get_school_count(filtered)
-    avg_score = get_avg_score(filtered)
+    # Statistics, from the importer's per-country aggregates
+    summary = dataset.filter_summary(int(selected_year), selected_regions, selected_countries)
+    school_count = get_school_count(summary)
+    avg_score = get_avg_score(summary)
     st.markdown(f"**Total Universities: {school_count}** | **Average Total Score: {avg_score if avg_score is not None else 'None'}**")
 
     # Filter function: main table
@@ -144,41 +289,12 @@ if mode == "Filter Mode":
         index=0  # Default to Score
     )
 
-    # Select columns based on display mode
-    main_cols = ["RANK", "NAME", "COUNTRY", "YEAR", "TOTAL_SCORE"]
-    for ind, score_col, rank_col in INDICATORS:
-        if ind in selected_indicators:
-            if display_mode == "Score":
-                main_cols += [score_col]
-            elif display_mode == "Rank":
-                main_cols += [rank_col]
-            else:  # Both
-                main_cols += [score_col, rank_col]
-
-    # Sort: by RANK ascending
-    show_df = filtered[main_cols].copy()
-    # RANK might be string, need to convert to numeric for sorting
-    show_df["RANK_SORT"] = pd.to_numeric(show_df["RANK"], errors="coerce")
-    show_df = show_df.sort_values(["YEAR", "RANK_SORT"]).drop(columns=["RANK_SORT"])
-
-    # Column header beautification
-    col_rename = {
-        "RANK": "Rank", "NAME": "Name", "COUNTRY": "Country", "YEAR": "Year", "TOTAL_SCORE": "Total Score"
-    }
-    for ind, score_col, rank_col in INDICATORS:
-        if ind in selected_indicators:
-            if display_mode == "Score":
-                col_rename[score_col] = f"{ind} Score"
-            elif display_mode == "Rank":
-                col_rename[rank_col] = f"{ind} Rank"
-            else:  # Both
-                col_rename[score_col] = f"{ind} Score"
-                col_rename[rank_col] = f"{ind} Rank"
-
-    show_df = show_df.rename(columns=col_rename)
-    show_df = show_df.replace({None: "None", "": "None"})
-    show_df = show_df.reset_index(drop=True)
-    show_df.index = show_df.index + 1  # Index starts from 1
+    # Rendered page, shared across reruns and sessions for the same filters
+    _, col_rename = table_columns(["RANK", "NAME", "COUNTRY", "YEAR", "TOTAL_SCORE"], selected_indicators, display_mode)
+    sort_col, ascending, page, page_size = table_controls('filter_table', col_rename, "RANK", True, school_count)
+    show_df = render_filter_table(snapshot_id, int(selected_year), tuple(selected_regions),
+                                  tuple(selected_countries), tuple(selected_indicators), display_mode,
+                                  sort_col, ascending, page, page_size)
 
     # Display table
     st.dataframe(show_df, use_container_width=True)
@@ -194,21 +310,9 @@ elif mode == "Search Mode":
         help="Type part of a university name to see suggestions."
     )
     
-    # Enhanced auto-complete suggestions with fuzzy search
+    # Auto-complete suggestions from the name search index
     if len(search_input.strip()) >= 2:
-        # Get suggestions based on partial match
-        suggestions = []
-        search_lower = search_input.lower()
-        
-        for name in univ_names:
-            name_lower = name.lower()
-            # Check if search term appears anywhere in the name
-            if search_lower in name_lower:
-                suggestions.append(name)
-        
-        # Sort by relevance (exact matches first, then partial matches)
-        suggestions.sort(key=lambda x: (x.lower().startswith(search_lower), x.lower().find(search_lower)))
-        suggestions = suggestions[:5]
+        suggestions = [match.name for match in dataset.search_names(search_input, 5)]
         
         if suggestions:
             st.markdown(
@@ -223,11 +327,13 @@ elif mode == "Search Mode":
     
     # Search function: university yearly comparison
     if search_input.strip():
-        search_df = df[df['NAME'].str.contains(search_input, case=False, na=False)]
-        if not search_df.empty:
+        # Resolve the input to one university, then fetch its editions by id
+        search_match = choose_university(search_input, key='search_choice')
+        search_df = dataset.university_history(search_match.univ_id) if search_match else None
+        if search_df is not None and not search_df.empty:
             st.session_state['show_search'] = True
             st.session_state['search_name'] = search_input
-            st.subheader(f"{search_df.iloc[0]['NAME']}")
+            st.subheader(f"{search_match.name}")
             
             # Display mode selector
             display_mode = st.radio(
@@ -240,34 +346,11 @@ elif mode == "Search Mode":
             # Prepare data
             school_data = search_df.sort_values('YEAR', ascending=False)
             
-            # Select columns based on display mode
-            display_cols = ["YEAR", "RANK", "TOTAL_SCORE"]
-            for ind, score_col, rank_col in INDICATORS:
-                if display_mode == "Score":
-                    display_cols += [score_col]
-                elif display_mode == "Rank":
-                    display_cols += [rank_col]
-                else:  # Both
-                    display_cols += [score_col, rank_col]
-            
-            # Display data
-            display_df = school_data[display_cols].copy()
-            
-            # Column header beautification
-            col_rename = {"YEAR": "Year", "RANK": "Rank", "TOTAL_SCORE": "Total Score"}
-            for ind, score_col, rank_col in INDICATORS:
-                if display_mode == "Score":
-                    col_rename[score_col] = f"{ind} Score"
-                elif display_mode == "Rank":
-                    col_rename[rank_col] = f"{ind} Rank"
-                else:  # Both
-                    col_rename[score_col] = f"{ind} Score"
-                    col_rename[rank_col] = f"{ind} Rank"
-            
-            display_df = display_df.rename(columns=col_rename)
-            display_df = display_df.replace({None: "None", "": "None", "-": "N/A"})
-            display_df = display_df.reset_index(drop=True)
-            display_df.index = display_df.index + 1
+            # Paged table of the selected columns
+            display_cols, col_rename = table_columns(["YEAR", "RANK", "TOTAL_SCORE"], indicator_options, display_mode)
+            sort_col, ascending, page, page_size = table_controls('search_table', col_rename, "YEAR", False, len(school_data))
+            display_df = render_table(school_data, display_cols, col_rename, sort_col, ascending, page, page_size,
+                                      {None: "None", "": "None", "-": "N/A"})
             
             st.dataframe(display_df, use_container_width=True)
             
@@ -279,14 +362,13 @@ elif mode == "Search Mode":
             st.markdown("#### 📈 Ranking Trend Over Years")
             
             # Prepare ranking data for chart
-            ranking_data = school_data[['YEAR', 'RANK']].copy()
-            ranking_data['RANK_NUMERIC'] = pd.to_numeric(ranking_data['RANK'], errors='coerce')
+            ranking_data = school_data[['YEAR', 'RANK_LO']].copy()
             
             # Create ranking trend chart
             fig_rank = go.Figure()
             fig_rank.add_trace(go.Scatter(
                 x=ranking_data['YEAR'],
-                y=ranking_data['RANK_NUMERIC'],
+                y=ranking_data['RANK_LO'],
                 mode='lines+markers',
                 name='Rank',
                 line=dict(color='#1f77b4', width=3),
@@ -294,7 +376,7 @@ elif mode == "Search Mode":
             ))
             
             fig_rank.update_layout(
-                title=f"{search_df.iloc[0]['NAME']} - Ranking Trend",
+                title=f"{search_match.name} - Ranking Trend",
                 xaxis_title="Year",
                 yaxis_title="Rank",
                 height=400,
@@ -332,7 +414,7 @@ elif mode == "Search Mode":
                     # Only add traces for selected indicators
                     if indicator_name in selected_indicators:
                         # Get scores for this indicator
-                        scores = pd.to_numeric(school_data[score_col], errors='coerce')
+                        scores = school_data[score_col]
                         
                         fig_scores.add_trace(go.Scatter(
                             x=school_data['YEAR'],
@@ -344,7 +426,7 @@ elif mode == "Search Mode":
                         ))
                 
                 fig_scores.update_layout(
-                    title=f"{search_df.iloc[0]['NAME']} - Indicator Scores Trend",
+                    title=f"{search_match.name} - Indicator Scores Trend",
                     xaxis_title="Year",
                     yaxis_title="Score",
                     height=500,
@@ -387,21 +469,6 @@ elif mode == "Compare Mode":
                                placeholder="Enter 2-3 letters to see suggestions", key='school4')
     
     # Show suggestions for each input box
-    def show_suggestions(input_text, box_name):
-        if len(input_text.strip()) >= 2:
-            suggestions = []
-            search_lower = input_text.lower()
-            for name in univ_names:
-                name_lower = name.lower()
-                if search_lower in name_lower:
-                    suggestions.append(name)
-            suggestions.sort(key=lambda x: (x.lower().startswith(search_lower), x.lower().find(search_lower)))
-            suggestions = suggestions[:3]
-            if suggestions:
-                st.markdown(f'<div style="color: #666; font-size: 0.8em; margin-left: 10px; margin-bottom: 5px;"><strong>{box_name} suggestions:</strong></div>', unsafe_allow_html=True)
-                for i, suggestion in enumerate(suggestions, 1):
-                    st.markdown(f'<div style="color: #888; font-size: 0.75em; margin-left: 20px;">{i}. {suggestion}</div>', unsafe_allow_html=True)
-    
     show_suggestions(school1, "University 1")
     show_suggestions(school2, "University 2")
     show_suggestions(school3, "University 3")
@@ -438,54 +505,39 @@ elif mode == "Compare Mode":
             country_max_rank = st.selectbox("Rank difference for country maximum", [10, 30, 50, 100], key='country_max_rank')
     
     # Comparison analysis
-    schools_to_compare = [s for s in [school1, school2, school3, school4] if s.strip()]
+    schools_to_compare = [(f"University {i}", s) for i, s in enumerate([school1, school2, school3, school4], 1) if s.strip()]
     
     if schools_to_compare:
-        # Get data for all universities
+        # Get data for all universities, each box resolved once against the comparison year
         all_school_data = []
         found_schools = []
-        
-        for school in schools_to_compare:
-            school_data = df[(df['YEAR'] == compare_year) & 
-                           (df['NAME'].str.contains(school, case=False, na=False))]
-            if not school_data.empty:
-                all_school_data.append(school_data.iloc[0])
-                found_schools.append(school_data.iloc[0]['NAME'])
-        
-        # Get University 1 data for group comparisons
         university1_data = None
-        if school1.strip():
-            university1_data = df[(df['YEAR'] == compare_year) & 
-                                (df['NAME'].str.contains(school1, case=False, na=False))]
-            if not university1_data.empty:
-                university1_data = university1_data.iloc[0]
+        
+        for box_name, school in schools_to_compare:
+            school_data = resolve_school(school, int(compare_year), box_name)
+            if school_data is not None:
+                all_school_data.append(school_data)
+                found_schools.append(school_data['NAME'])
+                # University 1 data for group comparisons
+                if box_name == "University 1":
+                    university1_data = school_data
         
         # Calculate group data if University 1 is selected and groups are enabled
         group_data = []
         
-        if university1_data is not None:
-            # Handle rank conversion - extract first number if it's a range
-            rank_str = str(university1_data['RANK'])
-            if '-' in rank_str:
-                target_rank = int(rank_str.split('-')[0])
-            else:
-                target_rank = int(rank_str)
+        if university1_data is not None and pd.notna(university1_data['RANK_LO']):
+            # Banded ranks are compared by their lower bound
+            target_rank = int(university1_data['RANK_LO'])
             target_country = university1_data['COUNTRY']
             
             # Higher ranked universities - Average
             if higher_avg_enabled:
                 start_rank = max(1, target_rank - higher_avg_rank)
                 end_rank = target_rank - 1
-                higher_avg_schools = df[(df['YEAR'] == compare_year) & 
-                                      (pd.to_numeric(df['RANK'], errors='coerce') >= start_rank) & 
-                                      (pd.to_numeric(df['RANK'], errors='coerce') <= end_rank)]
+                higher_avg_group = dataset.group_aggregate(int(compare_year), ('rank', start_rank, end_rank))
                 
-                if not higher_avg_schools.empty:
-                    avg_scores = {}
-                    for ind, score_col, _ in INDICATORS:
-                        scores = pd.to_numeric(higher_avg_schools[score_col], errors='coerce').dropna()
-                        avg_score = scores.mean() if len(scores) > 0 else 0
-                        avg_scores[score_col] = round(avg_score, 2)
+                if higher_avg_group.count:
+                    avg_scores = group_scores(higher_avg_group.mean)
                     
                     group_data.append({
                         'NAME': f'Higher Ranked (Top {higher_avg_rank}) - Average',
@@ -498,16 +550,10 @@ elif mode == "Compare Mode":
             if higher_max_enabled:
                 start_rank = max(1, target_rank - higher_max_rank)
                 end_rank = target_rank - 1
-                higher_max_schools = df[(df['YEAR'] == compare_year) & 
-                                      (pd.to_numeric(df['RANK'], errors='coerce') >= start_rank) & 
-                                      (pd.to_numeric(df['RANK'], errors='coerce') <= end_rank)]
+                higher_max_group = dataset.group_aggregate(int(compare_year), ('rank', start_rank, end_rank))
                 
-                if not higher_max_schools.empty:
-                    max_scores = {}
-                    for ind, score_col, _ in INDICATORS:
-                        scores = pd.to_numeric(higher_max_schools[score_col], errors='coerce').dropna()
-                        max_score = scores.max() if len(scores) > 0 else 0
-                        max_scores[score_col] = round(max_score, 2)
+                if higher_max_group.count:
+                    max_scores = group_scores(higher_max_group.max)
                     
                     group_data.append({
                         'NAME': f'Higher Ranked (Top {higher_max_rank}) - Maximum',
@@ -518,40 +564,30 @@ elif mode == "Compare Mode":
             
             # Same country universities - Average
             if country_avg_enabled:
-                # Get all universities from the same country in the specified year
-                country_avg_schools = df[(df['YEAR'] == compare_year) & 
-                                       (df['COUNTRY'] == target_country)]
+                # All universities from the same country in the specified year
+                country_group = dataset.group_aggregate(int(compare_year), ('country', target_country))
                 
-                if not country_avg_schools.empty:
-                    country_avg_scores = {}
-                    for ind, score_col, _ in INDICATORS:
-                        scores = pd.to_numeric(country_avg_schools[score_col], errors='coerce').dropna()
-                        avg_score = scores.mean() if len(scores) > 0 else 0
-                        country_avg_scores[score_col] = round(avg_score, 2)
+                if country_group.count:
+                    country_avg_scores = group_scores(country_group.mean)
                     
                     group_data.append({
                         'NAME': f'Same Country (Top {country_avg_rank}) - Average',
-                        'RANK': f'All {len(country_avg_schools)} universities',
+                        'RANK': f'All {country_group.count} universities',
                         'TOTAL_SCORE': round(sum(country_avg_scores.values()), 2),
                         **country_avg_scores
                     })
             
             # Same country universities - Maximum
             if country_max_enabled:
-                # Get all universities from the same country in the specified year
-                country_max_schools = df[(df['YEAR'] == compare_year) & 
-                                       (df['COUNTRY'] == target_country)]
+                # All universities from the same country in the specified year
+                country_group = dataset.group_aggregate(int(compare_year), ('country', target_country))
                 
-                if not country_max_schools.empty:
-                    country_max_scores = {}
-                    for ind, score_col, _ in INDICATORS:
-                        scores = pd.to_numeric(country_max_schools[score_col], errors='coerce').dropna()
-                        max_score = scores.max() if len(scores) > 0 else 0
-                        country_max_scores[score_col] = round(max_score, 2)
+                if country_group.count:
+                    country_max_scores = group_scores(country_group.max)
                     
                     group_data.append({
                         'NAME': f'Same Country (Top {country_max_rank}) - Maximum',
-                        'RANK': f'All {len(country_max_schools)} universities',
+                        'RANK': f'All {country_group.count} universities',
                         'TOTAL_SCORE': round(sum(country_max_scores.values()), 2),
                         **country_max_scores
                     })
@@ -588,6 +624,7 @@ elif mode == "Compare Mode":
             show_comparison = show_comparison.replace({None: "None", "": "None", "-": "N/A"})
             
             # Hide Total Score for group comparisons (not universities)
+            show_comparison['Total Score'] = show_comparison['Total Score'].astype(object)
             for idx, row in show_comparison.iterrows():
                 university_group_name = row['University/Group']
                 # Check if this is a group comparison (contains keywords like "Higher Ranked", "Same Country")
@@ -613,8 +650,8 @@ elif mode == "Compare Mode":
                 indicators = []
                 
                 for ind, score_col, _ in INDICATORS:
-                    score = safe_float(row[score_col])
-                    if score is not None:
+                    score = row[score_col]
+                    if pd.notna(score):
                         scores.append(score)
                         indicators.append(ind)
                     else:
@@ -660,15 +697,316 @@ elif mode == "Compare Mode":
             # Display the chart
             st.plotly_chart(fig, use_container_width=True)
             
-            # Download button
-            if st.button("📊 Download", key='download_compare'):
-                output = f"university_comparison_{compare_year}.xlsx"
-                with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                    show_comparison.to_excel(writer, sheet_name='Comparison', index=False)
-                st.success(f"✅ Data downloaded to {output}")
+            # Download button; the row labels carry the selected universities and group settings
+            download_table(
+                show_comparison,
+                f"university_comparison_{compare_year}",
+                ("compare", int(compare_year), tuple(show_comparison['University/Group'])),
+                key='download_compare'
+            )
         else:
             st.warning("❌ No matching universities found")
 
+elif mode == "Batch Compare Mode":
+    # Batch compare mode - any number of universities from a pasted or uploaded list, resolved in one bulk lookup
+    st.subheader("Batch University Comparison")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        batch_year = st.selectbox("Select Comparison Year", years, index=len(years)-1, key='batch_year')
+    with col2:
+        batch_indicators = st.multiselect("Indicators", indicator_options, default=indicator_options, key='batch_indicators')
+
+    col1, col2 = st.columns(2)
+    with col1:
+        batch_text = st.text_area(
+            "Universities (one name or university id per line)",
+            height=200,
+            placeholder="Peking University\nFudan\nUniversity of Oxford",
+            key='batch_text'
+        )
+    with col2:
+        batch_file = st.file_uploader(
+            "Or upload a list (first column is used)",
+            type=["txt", "csv", "xlsx"],
+            help="A .txt file has one name or university id per line. In a .csv or .xlsx file the first "
+                 "column is read and its first row is skipped as a header; untick 'First row is a header' "
+                 "when the list starts on the first row.",
+            key='batch_file'
+        )
+        batch_has_header = st.checkbox("First row is a header (.csv/.xlsx)", value=True, key='batch_has_header')
+
+    batch_entries = batch_text.splitlines() + (read_batch_file(batch_file, batch_has_header) if batch_file is not None else [])
+    batch_entries = [entry.strip() for entry in batch_entries if entry and entry.strip()]
+
+    if batch_entries:
+        # Resolve every entry at once; repeated entries for one university are kept once
+        batch_matches = dataset.resolve_many(tuple(batch_entries), int(batch_year))
+        batch_ids = list(dict.fromkeys(match.univ_id for match in batch_matches if match is not None))
+        unmatched = [entry for entry, match in zip(batch_entries, batch_matches) if match is None]
+
+        with st.expander(f"Name resolution ({len(batch_entries) - len(unmatched)} of {len(batch_entries)} matched)"):
+            resolution_df = pd.DataFrame({
+                "Input": batch_entries,
+                "Matched University": [match.name if match else "Not found" for match in batch_matches],
+                "University ID": [match.univ_id if match else None for match in batch_matches]
+            })
+            resolution_df.index = resolution_df.index + 1
+            st.dataframe(resolution_df, use_container_width=True)
+        # One warning per unresolved entry: ambiguous names list the universities they could mean
+        for entry in unmatched:
+            candidates = [match.name for match in dataset.search_names(entry, 3, int(batch_year))]
+            if candidates:
+                st.warning(f"❌ \"{entry}\" matches several universities ranked in {batch_year} (e.g. {'; '.join(candidates)}); enter the full name or university id")
+            else:
+                st.warning(f"❌ No university ranked in {batch_year} matches \"{entry}\"")
+
+        # One row lookup per university, ordered by rank
+        batch_rows = qs_data.sort_by_rank(dataset.university_rows(batch_ids, int(batch_year)))
+        unranked = [dataset.univ_names[univ_id] for univ_id in batch_ids if (univ_id, int(batch_year)) not in dataset.row_by_univ_year]
+        if unranked:
+            st.info(f"Not ranked in {batch_year}: {', '.join(unranked)}")
+
+        if not batch_rows.empty:
+            batch_summary = qs_data.aggregate(batch_rows)
+            avg_total = batch_summary.mean['TOTAL_SCORE']
+            st.markdown(f"**Universities: {batch_summary.count}** | **Average Total Score: {round(avg_total, 2) if pd.notna(avg_total) else 'None'}**")
+
+            score_cols = ["TOTAL_SCORE"] + [score_col for ind, score_col, _ in INDICATORS if ind in batch_indicators]
+            score_labels = ["Total Score"] + [f"{ind} Score" for ind, _, _ in INDICATORS if ind in batch_indicators]
+            batch_df = batch_rows[["RANK", "NAME", "COUNTRY"] + score_cols].rename(
+                columns={"RANK": "Rank", "NAME": "Name", "COUNTRY": "Country", **dict(zip(score_cols, score_labels))}
+            )
+            batch_df = batch_df.reset_index(drop=True)
+            batch_df.index = batch_df.index + 1
+            st.dataframe(batch_df, use_container_width=True)
+            download_table(
+                batch_df,
+                f"university_batch_comparison_{batch_year}",
+                ("batch", int(batch_year), tuple(batch_rows["UNIV_ID"]), tuple(batch_indicators)),
+                key='download_batch'
+            )
+
+            # All universities and indicators in one heatmap
+            st.markdown("#### 📊 Indicator Scores")
+            fig_batch = go.Figure(go.Heatmap(
+                z=qs_data.score_matrix(batch_rows)[:, [qs_data.AGGREGATE_COLUMNS.index(col) for col in score_cols]],
+                x=score_labels,
+                y=batch_rows["NAME"].tolist(),
+                colorscale="Blues",
+                zmin=0,
+                zmax=100,
+                hoverongaps=False
+            ))
+            fig_batch.update_layout(
+                title=f"University Comparison ({batch_year})",
+                height=max(400, 24 * len(batch_rows) + 150),
+                yaxis=dict(autorange="reversed")
+            )
+            st.plotly_chart(fig_batch, use_container_width=True)
+    else:
+        st.info("Paste university names or ids, or upload a list, to compare them")
+
+elif mode == "Benchmark Mode":
+    # Benchmark mode - one university's indicators against a peer group. Peer groups are lookups on the
+    # dataset's precomputed rank order (rank windows, ±N neighbours) and country indexes.
+    st.subheader("Benchmark Analysis")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        benchmark_year = st.selectbox("Select Year", years, index=len(years)-1, key='benchmark_year')
+    with col2:
+        target_school = st.text_input(
+            "Target University",
+            value=st.session_state['benchmark_school'],
+            placeholder="Enter 2-3 letters to see suggestions",
+            key='benchmark_school_input'
+        )
+    show_suggestions(target_school, "Target University")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        benchmark_group = st.selectbox(
+            "Peer Group",
+            ["Higher Ranked (Top N)", "Rank Neighbours (±N)", "Same Country"],
+            key='benchmark_group'
+        )
+    with col2:
+        if benchmark_group == "Same Country":
+            benchmark_scope = st.selectbox("Scope", ["Overall", "Top 100", "Top 200", "Top 300"], key='benchmark_range_country')
+        else:
+            benchmark_range = st.selectbox("Range (N)", [10, 20, 30, 50], key='benchmark_range')
+
+    # Update session state
+    st.session_state['benchmark_school'] = target_school
+
+    if target_school.strip():
+        target_row = resolve_school(target_school, int(benchmark_year), "Target university")
+
+        if target_row is not None and pd.notna(target_row['RANK_LO']):
+            target_rank = int(target_row['RANK_LO'])
+            target_country = target_row['COUNTRY']
+            st.success(f"✅ Target university: {target_row['NAME']} (Rank: {target_row['RANK']}, Country: {target_country})")
+
+            # Peer group definition
+            if benchmark_group == "Higher Ranked (Top N)":
+                start_rank = max(1, target_rank - benchmark_range)
+                end_rank = target_rank - 1
+                peer_group = ('rank', start_rank, end_rank)
+                peer_label = f"Top {benchmark_range} Higher Ranked"
+                st.info(f"Peer range: Rank {start_rank} - {end_rank}")
+            elif benchmark_group == "Rank Neighbours (±N)":
+                peer_group = ('neighbors', int(target_row['UNIV_ID']), benchmark_range)
+                peer_label = f"±{benchmark_range} Rank Neighbours"
+                st.info(f"Peer range: the {benchmark_range} universities ranked directly above and below")
+            elif benchmark_scope == "Overall":
+                peer_group = ('country', target_country)
+                peer_label = "Same Country"
+                st.info(f"Peer range: all universities in {target_country}")
+            else:
+                rank_limit = int(benchmark_scope.replace("Top ", ""))
+                peer_group = ('country_top', target_country, rank_limit)
+                peer_label = f"Same Country (Top {rank_limit})"
+                st.info(f"Peer range: universities in {target_country} ranked {rank_limit} or better")
+
+            peers = dataset.group_aggregate(int(benchmark_year), peer_group)
+            st.info(f"Found {peers.count} universities in the peer group")
+
+            if peers.count:
+                indicator_names = [ind for ind, _, _ in INDICATORS]
+                target_scores = [target_row[score_col] if pd.notna(target_row[score_col]) else 0 for _, score_col, _ in INDICATORS]
+                avg_scores = list(group_scores(peers.mean).values())
+                max_scores = list(group_scores(peers.max).values())
+
+                # Target against the peer group's average and maximum
+                fig_benchmark = go.Figure()
+                fig_benchmark.add_trace(go.Scatter(
+                    x=indicator_names,
+                    y=target_scores,
+                    mode='lines+markers',
+                    name=target_row['NAME'],
+                    line=dict(color='#1f77b4', width=3),
+                    marker=dict(size=8)
+                ))
+                fig_benchmark.add_trace(go.Scatter(
+                    x=indicator_names,
+                    y=avg_scores,
+                    mode='lines+markers',
+                    name=f"{peer_label} - Average",
+                    line=dict(color='#2ca02c', width=2),
+                    marker=dict(size=6)
+                ))
+                fig_benchmark.add_trace(go.Scatter(
+                    x=indicator_names,
+                    y=max_scores,
+                    mode='lines+markers',
+                    name=f"{peer_label} - Maximum",
+                    line=dict(color='#ff7f0e', width=2),
+                    marker=dict(size=6)
+                ))
+                fig_benchmark.update_layout(
+                    title=f"{target_row['NAME']} vs {peer_label} ({benchmark_year})",
+                    xaxis_title="Indicators",
+                    yaxis_title="Score",
+                    height=500,
+                    showlegend=True,
+                    hovermode='x unified'
+                )
+                st.plotly_chart(fig_benchmark, use_container_width=True)
+
+                # Detailed comparison
+                st.subheader("Detailed Comparison")
+                benchmark_df = pd.DataFrame({
+                    "Indicator": indicator_names,
+                    target_row['NAME']: target_scores,
+                    f"{peer_label} - Average": avg_scores,
+                    f"{peer_label} - Maximum": max_scores
+                })
+                benchmark_df.index = benchmark_df.index + 1
+                st.dataframe(benchmark_df, use_container_width=True)
+
+                with st.expander(f"Peer universities ({peers.count})"):
+                    peer_df = dataset.group_peers(int(benchmark_year), peer_group)[["RANK", "NAME", "COUNTRY", "TOTAL_SCORE"]]
+                    peer_df = peer_df.rename(columns={"RANK": "Rank", "NAME": "Name", "COUNTRY": "Country", "TOTAL_SCORE": "Total Score"})
+                    peer_df = peer_df.reset_index(drop=True)
+                    peer_df.index = peer_df.index + 1
+                    st.dataframe(peer_df, use_container_width=True)
+
+                # Strengths and weaknesses against the peer average
+                st.subheader("Strengths and Weaknesses")
+                strengths = []
+                weaknesses = []
+                for indicator, target_score, avg_score in zip(indicator_names, target_scores, avg_scores):
+                    if target_score > avg_score:
+                        strengths.append(f"✅ {indicator}: {target_score:.1f} > {avg_score:.1f}")
+                    else:
+                        weaknesses.append(f"❌ {indicator}: {target_score:.1f} ≤ {avg_score:.1f}")
+
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.markdown("**Strengths:**")
+                    for strength in strengths[:5]:
+                        st.write(strength)
+                with col2:
+                    st.markdown("**Weaknesses:**")
+                    for weakness in weaknesses[:5]:
+                        st.write(weakness)
+            else:
+                st.warning("⚠️ No universities found in this peer group")
+        elif target_row is not None:
+            st.warning(f"⚠️ {target_row['NAME']} has no numeric rank in {benchmark_year}, so it cannot be benchmarked")
+    else:
+        st.info("Enter a target university to start the benchmark analysis")
+
+elif mode == "Country/Region Leaderboard":
+    # Leaderboard mode - countries or regions ranked by the importer's precomputed statistics
+    st.subheader("Country/Region Leaderboard")
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        board_year = st.selectbox("Year", years, index=len(years)-1, key='board_year')
+    with col2:
+        board_level = st.radio("Group By", ["Country", "Region"], horizontal=True, key='board_level')
+    with col3:
+        board_metric = st.selectbox("Score", ["Total Score"] + indicator_options, key='board_metric')
+    with col4:
+        board_stat = st.selectbox("Rank By", list(LEADERBOARD_STATS), key='board_stat')
+    board_min = st.number_input("Minimum universities with a score", min_value=1, value=3 if board_level == "Country" else 1,
+                                step=1, key=f'board_min_{board_level}')
+
+    metric_col = dict((ind, score_col) for ind, score_col, _ in INDICATORS).get(board_metric, "TOTAL_SCORE")
+    group_col = board_level.upper()
+    board = dataset.leaderboard(int(board_year), group_col, metric_col)
+    board = board[board['N'] >= board_min]
+    board = board.sort_values(LEADERBOARD_STATS[board_stat], ascending=False, na_position='last', kind='stable')
+
+    if not board.empty:
+        board_cols = [group_col] + (["REGION"] if group_col == "COUNTRY" else []) + ["UNIVERSITIES", "N"] + list(LEADERBOARD_STATS.values())
+        show_board = board[board_cols].rename(columns={
+            group_col: board_level, "REGION": "Region", "UNIVERSITIES": "Universities", "N": "With Score",
+            **{col: label for label, col in LEADERBOARD_STATS.items()}
+        })
+        show_board = show_board.round(2).reset_index(drop=True)
+        show_board.index = show_board.index + 1
+        st.dataframe(show_board, use_container_width=True)
+
+        # Top 20 by the selected statistic
+        top = board.head(20)
+        fig_board = go.Figure(go.Bar(
+            x=top[group_col],
+            y=top[LEADERBOARD_STATS[board_stat]].round(2),
+            marker_color='#1f77b4'
+        ))
+        fig_board.update_layout(
+            title=f"{board_metric} - {board_stat} by {board_level} ({board_year})",
+            xaxis_title=board_level,
+            yaxis_title=board_metric,
+            height=450
+        )
+        st.plotly_chart(fig_board, use_container_width=True)
+    else:
+        st.info("No countries or regions match the selection.")
+
 # Footer section
 st.markdown("---")
 st.markdown(
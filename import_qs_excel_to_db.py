@@ -1,7 +1,24 @@
+import argparse
+import difflib
+import hashlib
+import itertools
 import os
+import re
+import shutil
 import sqlite3
+import tempfile
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
 import openpyxl
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # 列式导出为可选功能，未安装 pyarrow 时只生成 SQLite 数据库
+    pa = None
+
 # 国家到地区映射（部分示例，后续可补充完整）
 country_region_map = {
     # Africa
@@ -21,6 +38,17 @@ country_region_map = {
     # Oceania
     'Australia': 'Oceania', 'New Zealand': 'Oceania',
 }
+# 各年份源文件对同一国家的不同写法 -> 最近一年的写法，用于跨年份匹配同一所高校
+country_aliases = {
+    'United States': 'United States of America', 'South Korea': 'Republic of Korea',
+    'Russia': 'Russian Federation', 'Turkey': 'Türkiye', 'Czech Republic': 'Czechia',
+    'Iran, Islamic Republic of': 'Iran (Islamic Republic of)', 'Hong Kong SAR': 'Hong Kong SAR, China',
+    'Vietnam': 'Viet Nam', 'Venezuela': 'Venezuela (Bolivarian Republic of)',
+    'Palestinian Territory, Occupied': 'Palestine', 'Brunei': 'Brunei Darussalam', 'Macau SAR': 'Macao SAR, China',
+}
+def canonical_country(country):
+    return country_aliases.get(country, country)
+
 def get_region(country):
     if not country:
         return None
@@ -42,6 +70,8 @@ def get_region(country):
 
 data_dir = 'data'
 db_path = os.path.join(data_dir, 'qs_rankings.db')
+# 按年份分区的列式副本：qs_rankings_parquet/YEAR=2026/part-0.parquet，_SNAPSHOT 记录对应的数据库快照
+parquet_dir = os.path.join(data_dir, 'qs_rankings_parquet')
 excel_files = [
     '2022QSRankings.xlsx',
     '2023QSRankings.xlsx',
@@ -74,9 +104,79 @@ missing_fields = {
     2026: [],
 }
 
+# 分数列存 REAL，指标排名列存 INTEGER，缺失值统一为 NULL
+score_columns = [col for col in columns if col.endswith('_SCORE')]
+rank_columns = [col for col in columns if col.endswith('_RANK')]
+
+# 排名解析结果：总排名写入 RANK_LO/RANK_HI/RANK_TIED，
+# 指标排名列本身即下界，另写 *_RANK_HI/*_RANK_TIED
+rank_bound_columns = ['RANK_LO', 'RANK_HI', 'RANK_TIED']
+for col in rank_columns:
+    rank_bound_columns += [f'{col}_HI', f'{col}_TIED']
+# 解析出的行按 row_columns 排列；写库时再追加高校维表 id
+row_columns = columns + rank_bound_columns
+insert_columns = row_columns + ['UNIV_ID']
+
+def to_float(value):
+    # Excel 中分数可能是数字、数字字符串、'-' 或空串
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    if not text or text == '-':
+        return None
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+# 排名格式：12、'  12  '、'=25'（并列）、'601-650'（区间）、'1201+'（开区间）
+rank_pattern = re.compile(r'^(=)?\s*(\d+)\s*(?:([-–])\s*(\d+)|(\+))?$')
+
+def parse_rank(value):
+    # 返回 (下界, 上界, 是否并列)；'1201+' 的上界为 NULL，无法解析时全部为 NULL
+    if value is None:
+        return None, None, None
+    if isinstance(value, int):
+        return value, value, 0
+    match = rank_pattern.match(str(value).strip())
+    if not match:
+        return None, None, None
+    tied, lo, dash, hi, plus = match.groups()
+    lo = int(lo)
+    if dash:
+        hi = int(hi)
+    elif plus:
+        hi = None
+    else:
+        hi = lo
+    return lo, hi, 1 if tied else 0
+
+def clean_rank_text(value):
+    # 总排名保留原始文本（如 '601-650'）用于展示，只去掉多余空白
+    if value is None:
+        return None
+    text = str(value).strip()
+    return text or None
+
+# 数据库结构版本，写入 PRAGMA user_version；结构变化时递增，旧结构的数据库会整体重建
+schema_version = 7
+
+# 各年份按国家、地区预先汇总的统计表：分组列 -> 表名
+# 每个分组、每个分数列（TOTAL_SCORE 及各指标分数）一行：高校数、有该分数的高校数、均值、最值和四分位数
+stats_tables = {'COUNTRY': 'country_stats', 'REGION': 'region_stats'}
+
 def create_table(conn):
     cur = conn.cursor()
     cur.execute('DROP TABLE IF EXISTS qs_rankings')
+    cur.execute('DROP TABLE IF EXISTS import_manifest')
+    cur.execute('DROP TABLE IF EXISTS db_meta')
+    cur.execute('DROP TABLE IF EXISTS university_search')
+    cur.execute('DROP TABLE IF EXISTS university_aliases')
+    cur.execute('DROP TABLE IF EXISTS universities')
+    for table in stats_tables.values():
+        cur.execute(f'DROP TABLE IF EXISTS {table}')
     cur.execute(f'''
         CREATE TABLE qs_rankings (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -85,95 +185,787 @@ def create_table(conn):
             COUNTRY TEXT,
             YEAR INTEGER,
             REGION TEXT,
-            TOTAL_SCORE TEXT,
-            AR_SCORE TEXT,
-            AR_RANK TEXT,
-            ER_SCORE TEXT,
-            ER_RANK TEXT,
-            FSR_SCORE TEXT,
-            FSR_RANK TEXT,
-            CPF_SCORE TEXT,
-            CPF_RANK TEXT,
-            IFR_SCORE TEXT,
-            IFR_RANK TEXT,
-            ISR_SCORE TEXT,
-            ISR_RANK TEXT,
-            ISD_SCORE TEXT,
-            ISD_RANK TEXT,
-            IRN_SCORE TEXT,
-            IRN_RANK TEXT,
-            EO_SCORE TEXT,
-            EO_RANK TEXT,
-            SUS_SCORE TEXT,
-            SUS_RANK TEXT
+            TOTAL_SCORE REAL,
+            AR_SCORE REAL,
+            AR_RANK INTEGER,
+            ER_SCORE REAL,
+            ER_RANK INTEGER,
+            FSR_SCORE REAL,
+            FSR_RANK INTEGER,
+            CPF_SCORE REAL,
+            CPF_RANK INTEGER,
+            IFR_SCORE REAL,
+            IFR_RANK INTEGER,
+            ISR_SCORE REAL,
+            ISR_RANK INTEGER,
+            ISD_SCORE REAL,
+            ISD_RANK INTEGER,
+            IRN_SCORE REAL,
+            IRN_RANK INTEGER,
+            EO_SCORE REAL,
+            EO_RANK INTEGER,
+            SUS_SCORE REAL,
+            SUS_RANK INTEGER,
+            {', '.join(f'{col} INTEGER' for col in rank_bound_columns)},
+            UNIV_ID INTEGER REFERENCES universities (id)
+        )
+    ''')
+    # 高校维表：跨年份稳定的整数 id；规范名称、国家和地区取最近一年的数据
+    cur.execute('''
+        CREATE TABLE universities (
+            id INTEGER PRIMARY KEY,
+            CANONICAL_NAME TEXT,
+            COUNTRY TEXT,
+            REGION TEXT,
+            NAME_KEY TEXT
+        )
+    ''')
+    cur.execute('CREATE INDEX idx_universities_name_key ON universities (NAME_KEY)')
+    # 各年份出现过的校名写法 -> 高校 id
+    cur.execute('''
+        CREATE TABLE university_aliases (
+            ALIAS TEXT PRIMARY KEY,
+            UNIV_ID INTEGER NOT NULL REFERENCES universities (id)
+        )
+    ''')
+    # 记录每个源工作簿导入时的状态，用于判断哪些年份需要重新导入
+    cur.execute('''
+        CREATE TABLE import_manifest (
+            FILE_NAME TEXT PRIMARY KEY,
+            YEAR INTEGER,
+            SIZE INTEGER,
+            MTIME_NS INTEGER,
+            SHA256 TEXT,
+            ROW_COUNT INTEGER,
+            IMPORTED_AT TEXT
+        )
+    ''')
+    # 数据库元信息，如快照 id（snapshot_id），看板据此判断数据是否更新
+    cur.execute('''
+        CREATE TABLE db_meta (
+            KEY TEXT PRIMARY KEY,
+            VALUE TEXT
         )
     ''')
+    # 国家统计表另带所属地区，便于按地区筛选后合并国家统计
+    for group_col, table in stats_tables.items():
+        region_col = 'REGION TEXT,' if group_col != 'REGION' else ''
+        cur.execute(f'''
+            CREATE TABLE {table} (
+                YEAR INTEGER NOT NULL,
+                {group_col} TEXT NOT NULL,
+                {region_col}
+                METRIC TEXT NOT NULL,
+                UNIVERSITIES INTEGER NOT NULL,
+                N INTEGER NOT NULL,
+                MEAN REAL,
+                MIN REAL,
+                P25 REAL,
+                MEDIAN REAL,
+                P75 REAL,
+                MAX REAL,
+                PRIMARY KEY (YEAR, {group_col}, METRIC)
+            )
+        ''')
+    # 校名检索：trigram 分词的 FTS5 表，每所高校的各个检索词各一行，支持任意子串匹配
+    # qs_data.query_names 直接用 MATCH 检索；看板启动时读出全部检索词，建立带拼写容错的内存索引
+    cur.execute(
+        "CREATE VIRTUAL TABLE university_search "
+        "USING fts5(UNIV_ID UNINDEXED, NAME UNINDEXED, TERM, tokenize='trigram')"
+    )
+    cur.execute(f'PRAGMA user_version = {schema_version}')
     conn.commit()
 
-def import_excel_to_db():
-    conn = sqlite3.connect(db_path)
-    create_table(conn)
+def needs_rebuild(full=False):
+    # 数据库不存在或结构版本不一致时整库重建，否则在已有数据上做增量导入
+    if full or not os.path.exists(db_path):
+        return True
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    try:
+        return conn.execute('PRAGMA user_version').fetchone()[0] != schema_version
+    finally:
+        conn.close()
+
+# qs_data 中 SQL 查询（query_filtered、query_rank_window、query_name、query_history）的访问路径：
+# 按年份+排名区间、按年份+地区、按年份+国家、按校名、按高校 id
+# 排名索引以 RANK_LO 结尾（其后隐含 rowid），年份、单个地区或单个国家的筛选和排名区间查询按
+# 'RANK_LO NULLS LAST, id' 直接沿索引顺序读出，不再额外排序；多个地区时沿年份+排名索引扫描后过滤
+# 索引不覆盖 SELECT *，每行仍按 rowid 回表读取
+indexes = {
+    'idx_qs_rankings_year_rank': '(YEAR, RANK_LO)',
+    'idx_qs_rankings_year_region_rank': '(YEAR, REGION, RANK_LO)',
+    'idx_qs_rankings_year_country': '(YEAR, COUNTRY, RANK_LO)',
+    'idx_qs_rankings_name_year': '(NAME, YEAR)',
+    'idx_qs_rankings_univ_year': '(UNIV_ID, YEAR)',
+}
+
+def fold_text(text):
+    # 去掉重音符号并转小写：'Universität' -> 'universitat'
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+
+def name_aliases(name):
+    # 校名的检索词：完整校名、去掉括号部分的校名、括号中的简称（如 MIT），均做去重音处理
+    terms = [name]
+    short_name = re.sub(r'\s*\([^)]*\)', '', name).strip()
+    if short_name:
+        terms.append(short_name)
+    terms += [abbr.strip() for abbr in re.findall(r'\(([^)]*)\)', name) if abbr.strip()]
+    aliases = []
+    for term in terms:
+        folded = ' '.join(fold_text(term).split())
+        if folded not in aliases:
+            aliases.append(folded)
+    return aliases
+
+# 校名规则无法识别的改名：某年份的写法 -> 另一年份的写法，两者使用同一个校名键
+# 新发现的改名见导入时打印的疑似拆分报告（report_split_universities）
+university_renames = {
+    'King Abdul Aziz University (KAU)': 'King Abdulaziz University (KAU)',
+    'Universidad Nacional de Tucumà¡n': 'Universidad Nacional de Tucumán',
+    'Imam Muhammad Ibn Saud Islamic University - IMSIU': 'Imam Mohammad Ibn Saud Islamic University – IMSIU',
+    'Asfendiyarov Kazakh National Medical University': 'S.D. Asfendiyarov Kazakh National Medical University',
+    'MATE Hungarian University of Agriculture and Life Sciences': 'Hungarian University of Agriculture and Life Sciences',
+    'D. Serikbayev East Kazakhstan Technical University': 'D. Serikbayev East Kazakhstan state technical university',
+    'Auezov South Kazakhstan State University (SKSU)': 'Auezov South Kazakhstan University (SKU)',
+    'Al Jouf University': 'Jouf University',
+    'Kazakh National Agrarian University KazNAU': 'Kazakh National Agrarian University',
+    'Siksha ‘O’ Anusandhan (Deemed to be University), SOA': "Siksha 'O' Anusandhan (Deemed to be University)",
+    'Birla Institute of Technology and Science, Pilani': 'Birla Institute of Technology and Science',
+    'Université de Paris': 'Université Paris Cité',
+    'Birkbeck College, University of London': 'Birkbeck, University of London',
+    'City St George’s, University of London': 'City, University of London',
+    'UWE Bristol (University of the West of England)': 'University of the West of England',
+    'Universidad Iberoamericana (UIA)': 'Universidad Iberoamericana IBERO',
+    'Universidad Jesuita de Guadalajara - ITESO': 'ITESO, Universidad Jesuita de Guadalajara',
+    'Adam Mickiewicz University, Poznań': 'Adam Mickiewicz University',
+    'Silesian University of Technology in Gliwice': 'Silesian University of Technology',
+    'KIT, Karlsruhe Institute of Technology': 'Karlsruhe Institute of Technology (KIT)',
+    'Pavol Jozef Šafárik University in Košice': 'Pavol Josef Safarik University',
+    'Technische Universität Darmstadt': 'Technical University of Darmstadt',
+    'Atma Jaya Catholic University Indonesia': 'Atma Jaya Catholic University Jakarta',
+    'Vellore Institute of Technology (VIT), Vellore, India': 'Vellore Institute of Technology (VIT)',
+    'Universiti Malaysia Pahang Al-Sultan Abdullah (UMPSA)': 'Universiti Malaysia Pahang',
+    'Radboud University Nijmegen': 'Radboud University',
+    'Indian Institute of Technology BHU Varanasi (IIT BHU Varanasi)': 'Indian Institute of Technology (BHU) Varanasi',
+    'Indian Institute of Science (IISc) Bangalore': 'Indian Institute of Science',
+    'Sciences Po Paris': 'Sciences Po',
+    'Universitat Politècnica de Catalunya · BarcelonaTech (UPC)': 'Universitat Politècnica de Catalunya',
+    'Osmania University, Hyderabad': 'OSMANIA UNIVERSITY',
+    'Aligarh Muslim University (AMU), Aligarh': 'Aligarh Muslim University',
+    'Jamia Millia Islamia, New Delhi': 'Jamia Millia Islamia',
+    "Queen's University, Ontario": "Queen's University at Kingston",
+    'Università della Svizzera Italiana': 'USI - Università della Svizzera italiana',
+    'ETH Zurich (Swiss Federal Institute of Technology)': 'ETH Zurich - Swiss Federal Institute of Technology',
+    'Management and Science University - MSU Malaysia': 'Management and Science University',
+    'University of Hawaii at Mañoa': 'University of Hawaiʻi at Mānoa',
+    'St. Louis University': 'Saint Louis University',
+    'CUNY The City College of New York': 'The City College of New York',
+    'Saint Petersburg Electrotechnical University ETU-LETI': 'Saint-Petersburg Electrotechnical University LETI',
+    'Mendeleev University of Chemical Technology of Russia': 'Mendeleev University of Chemical Technology',
+    'Siberian Federal University, SibFU': 'Siberian Federal University',
+    'VSB - Technical University of Ostrava': 'Technical University of Ostrava',
+    'Gebze Yüksek Teknoloji Enstitüsü (GYTE)': 'Gebze Technical University (GTU)',
+    'Pontificia Universidad Católica Argentina Santa María de los Buenos Aires - UCA': 'Pontificia Universidad Católica Argentina',
+    'Vienna University of Technology': 'Technische Universität Wien',
+    'Universidade Estadual Paulista "Júlio de Mesquita Filho" (UNESP)': 'UNESP',
+    'The Federal University of Sao Carlos, UFSCar': 'Universidade Federal de São Carlos (UFSCar)',
+    'Université Paul-Valéry Montpellier 3': 'Paul Valéry University Montpellier',
+    'University Toulouse – Jean Jaurès': 'Université de Toulouse II-Le Mirail',
+    'Rheinisch-Westfälische Technische Hochschule Aachen': 'RWTH Aachen University',
+    'Universität Freiburg': 'Albert-Ludwigs-Universitaet Freiburg',
+    'Universität Erlangen-Nürnberg': 'Friedrich-Alexander-Universität Erlangen-Nürnberg',
+    'Georg-August-Universität Göttingen': 'University of Göttingen',
+    'Universität zu Köln': 'University of Cologne',
+    'University of Münster': 'Westfälische Wilhelms-Universität Münster',
+    'Technische Universität Dortmund': 'TU Dortmund University',
+    'Manipal Academy of Higher Education - Manipal University (MAHE)': 'Manipal Academy of Higher Education, Manipal, Karnataka, India',
+    'Jamia Hamdard, New Delhi': 'Jamia Hamdard',
+    'BINUS UNIVERSITY (Bina Nusantara University)': 'Bina Nusantara University (BINUS)',
+    'Universitas Negeri Yogyakarta': 'Yogyakarta State University',
+    'Islamic University of Indonesia (Universitas Islam Indonesia)': 'Universitas Islam Indonesia',
+    'Petra Christian University': 'Universitas Kristen Petra',
+    'University of Galway / Ollscoil na Gaillimhe': 'University of Galway',
+    'Università degli Studi di Roma - Tor Vergata': 'University of Rome "Tor Vergata"',
+    "Libera Universita' di Bolzano": 'Free University of Bozen-Bolzano',
+    'Universita\' degli Studi di Napoli "Parthenope"': 'University of Naples Parthenope',
+    'Abylkas Saginov Karaganda Technical University': 'Karaganda State Technical University',
+    'Pavlodar State University named after Toraighyrov': 'Toraighyrov University',
+    'Kyrgyz State Technical University named after I. Razzakov': 'Kyrgyz State Technical University',
+    'University of Canterbury | Te Whare Wānanga o Waitaha': 'University of Canterbury',
+    'AGH University of Science and Technology': 'AGH University of Krakow',
+    'Cracow University of Technology (Politechnika Krakowska)': 'Cracow University of Technology of Tadeusz Kościuszko',
+    'Technical University of Lublin': 'Lublin University of Technology',
+    'Universitatea de Vest din Timisoara / West University of Timisoara': 'West University of Timisoara',
+    'University of the Basque Country': 'Universidad del Pais Vasco',
+    'EPFL': 'École Polytechnique Fédérale de Lausanne',
+    'Zürcher Hochschule Winterthur': 'Zurich University of Applied Sciences (ZHAW)',
+    'Viet Nam National University Ho Chi Minh City (VNU-HCM)': 'Vietnam National University - Ho Chi Minh City (VNU-HCM)',
+    'Indian Institute of Information Technology, Allahabad': 'Indian Institute of Information Technology - Allahabad',
+    'Notre Dame University-Louaize NDU': 'Notre Dame University-Louaize (NDU)',
+    'Universidade Católica Portuguesa, UCP': 'Universidade Católica Portuguesa - UCP',
+}
+
+# 校名键中忽略的虚词（各语言的 of/the/in/and 等；'Università degli Studi di X' 即 'University of X'）
+key_stopwords = {
+    'the', 'of', 'in', 'at', 'and', 'de', 'di', 'du', 'des', 'del', 'della', 'delle', 'degli', 'studi',
+    'do', 'da', 'dos', 'das', 'la', 'le', 'les', 'los', 'el', 'zu', 'et', 'y', 'e', 'und',
+}
+# 去重音后仍保留的字母：'Tromsø' -> 'tromso'
+key_letters = str.maketrans({'ø': 'o', 'æ': 'ae', 'ł': 'l', 'đ': 'd', 'ı': 'i'})
+
+def key_words(text):
+    # 去重音、去撇号（"Ha'il" -> 'hail'，源数据中也有转义的 "d\'Azur"），其余标点视为分隔符
+    text = re.sub(r"\\?['’‘`]", '', fold_text(text).translate(key_letters))
+    return re.sub(r'[^\w\s]', ' ', text.replace('&', ' and ')).split()
+
+def university_key(name, country=None):
+    # 用于跨年份匹配同一所高校的校名键：
+    # 去掉括号部分、' - 简称' 后缀和结尾的国家名（'Southeast University, China'），
+    # 各语言的 University（Universität/Universidad/Université/Universiti…）统一为 'university'，
+    # 德语转写统一（'Duesseldorf' / 'Düsseldorf'），忽略虚词和词序
+    # 'The University of Edinburgh' / 'University of Edinburgh' -> 'edinburgh university'
+    # 'The University of Osaka' / 'Osaka University' -> 'osaka university'
+    # 'Universidade Federal do Paraná - UFPR' / 'Universidade Federal do Paraná (UFPR)' -> 'federal parana university'
+    name = university_renames.get(name, name)
+    country_words = key_words(re.sub(r'\([^)]*\)', ' ', country)) if country else []
+    text = re.sub(r'\([^)]*\)', ' ', name).strip()
+    # ' - 简称' 或 ' - 国家' 后缀（'Ural Federal University - UrFU'）；' - 校区' 保留（'University of Massachusetts - Boston'）
+    suffix = re.search(r'\s[-–—]\s*(\S+)$', text)
+    if suffix and (sum(ch.isupper() for ch in suffix.group(1)) >= 2 or key_words(suffix.group(1)) == country_words):
+        text = text[:suffix.start()]
+    words = key_words(text)
+    if country_words:
+        # 国家名作为后缀（'Universidad de Los Andes Colombia'），而非 'University of X' 中的 X
+        n = len(country_words)
+        if n and len(words) > n + 1 and words[-n:] == country_words and words[-n - 1] not in key_stopwords:
+            words = words[:-n]
+    words = ['university' if re.match(r'universi(?:t|dad)', word) else re.sub(r'([aou])e', r'\1', word)
+             for word in words]
+    key = ' '.join(sorted(word for word in words if word not in key_stopwords) or words)
+    # 只有简称的写法（如 'UCL (University College London)'）括号外为空时用括号内的全称
+    return key or ' '.join(key_words(name))
+
+def load_university_lookup(conn):
+    # 读出已有的高校维表，增量导入时沿用已分配的 id
+    lookup = {'alias': {}, 'key': {}, 'country': {}}
+    for univ_id, country, name_key in conn.execute('SELECT id, COUNTRY, NAME_KEY FROM universities'):
+        lookup['key'].setdefault(name_key, []).append(univ_id)
+        lookup['country'][univ_id] = country
+    lookup['alias'] = dict(conn.execute('SELECT ALIAS, UNIV_ID FROM university_aliases'))
+    return lookup
+
+def resolve_university(conn, lookup, name, country, used_ids):
+    # 依次按完全相同的校名写法（同一国家）、校名键匹配已有高校，否则新建；
+    # 同一年份内一个 id 只能对应一行（如 'Soochow University' 与 'Soochow University (Taiwan)'）
+    univ_id = lookup['alias'].get(name)
+    if (univ_id is not None and univ_id not in used_ids
+            and canonical_country(lookup['country'].get(univ_id)) == canonical_country(country)):
+        return univ_id
+    name_key = university_key(name, country)
+    candidates = [i for i in lookup['key'].get(name_key, []) if i not in used_ids]
+    # 只在同一国家内匹配（'Universidad de Los Andes' 在哥伦比亚和智利是两所高校）；
+    # 国家名称的新写法需加入 country_aliases
+    same_country = [i for i in candidates if canonical_country(lookup['country'].get(i)) == canonical_country(country)]
+    if same_country:
+        univ_id = same_country[0]
+    else:
+        univ_id = conn.execute(
+            'INSERT INTO universities (CANONICAL_NAME, COUNTRY, NAME_KEY) VALUES (?, ?, ?)',
+            (name, country, name_key)
+        ).lastrowid
+        lookup['key'].setdefault(name_key, []).append(univ_id)
+        lookup['country'][univ_id] = country
+    if name not in lookup['alias']:
+        conn.execute('INSERT INTO university_aliases (ALIAS, UNIV_ID) VALUES (?, ?)', (name, univ_id))
+        lookup['alias'][name] = univ_id
+    return univ_id
+
+def assign_university_ids(conn, lookup, rows):
+    # 为一个年份的行追加 UNIV_ID
+    name_idx = row_columns.index('NAME')
+    country_idx = row_columns.index('COUNTRY')
+    used_ids = set()
+    for row in rows:
+        univ_id = resolve_university(conn, lookup, row[name_idx], row[country_idx], used_ids)
+        used_ids.add(univ_id)
+        yield row + (univ_id,)
+
+def refresh_universities(conn):
+    # 规范名称、国家、地区取该校最近一年的记录
+    with conn:
+        conn.execute('''
+            UPDATE universities SET (CANONICAL_NAME, COUNTRY, REGION) = (
+                SELECT NAME, COUNTRY, REGION FROM qs_rankings
+                WHERE qs_rankings.UNIV_ID = universities.id
+                ORDER BY YEAR DESC LIMIT 1
+            )
+            WHERE id IN (SELECT UNIV_ID FROM qs_rankings)
+        ''')
+
+# 疑似拆分报告中两个校名的最低相似度
+split_name_similarity = 0.85
+
+def report_split_universities(conn):
+    # 同一国家、出现年份互不重叠且校名相近的高校 id 很可能是未识别的改名，打印出来供补充 university_renames
+    universities = {}
+    for univ_id, name, country, year in conn.execute(
+        'SELECT r.UNIV_ID, r.NAME, u.COUNTRY, r.YEAR FROM qs_rankings r JOIN universities u ON u.id = r.UNIV_ID'
+    ):
+        entry = universities.setdefault(univ_id, {'names': set(), 'years': set(), 'country': canonical_country(country)})
+        entry['names'].add(name)
+        entry['years'].add(year)
+    by_country = {}
+    for univ_id, entry in universities.items():
+        by_country.setdefault(entry['country'], []).append(univ_id)
+    suspects = []
+    for country, univ_ids in by_country.items():
+        for a, b in itertools.combinations(univ_ids, 2):
+            if universities[a]['years'] & universities[b]['years']:
+                continue
+            similarity = max(
+                difflib.SequenceMatcher(None, ' '.join(key_words(name_a)), ' '.join(key_words(name_b))).ratio()
+                for name_a in universities[a]['names'] for name_b in universities[b]['names']
+            )
+            if similarity >= split_name_similarity:
+                suspects.append((country, a, b))
+    for country, a, b in suspects:
+        names = [f"{'/'.join(sorted(universities[i]['names']))} {sorted(universities[i]['years'])}" for i in (a, b)]
+        print(f'疑似同一所高校（{country}）：{names[0]} <-> {names[1]}')
+    print(f'疑似拆分的高校: {len(suspects)} 对')
+    return suspects
+
+def build_name_search_index(conn):
+    # 每次导入后按当前数据重建校名检索表：规范名称及该校出现过的所有写法
+    with conn:
+        conn.execute('DELETE FROM university_search')
+        names = {}
+        for univ_id, canonical_name, alias in conn.execute('''
+            SELECT u.id, u.CANONICAL_NAME, a.ALIAS
+            FROM universities u JOIN university_aliases a ON a.UNIV_ID = u.id
+            WHERE u.id IN (SELECT UNIV_ID FROM qs_rankings)
+            ORDER BY u.id
+        '''):
+            terms = names.setdefault(univ_id, (canonical_name, []))[1]
+            for term in name_aliases(canonical_name) + name_aliases(alias):
+                if term not in terms:
+                    terms.append(term)
+        conn.executemany(
+            'INSERT INTO university_search (UNIV_ID, NAME, TERM) VALUES (?, ?, ?)',
+            (
+                (univ_id, canonical_name, term)
+                for univ_id, (canonical_name, terms) in names.items()
+                for term in terms
+            )
+        )
+        conn.execute("INSERT INTO university_search (university_search) VALUES ('optimize')")
+
+def quartiles(values):
+    # 最小值、下四分位数、中位数、上四分位数、最大值；线性插值，与 numpy/pandas 默认算法一致
+    values = sorted(values)
+    result = []
+    for q in (0, 0.25, 0.5, 0.75, 1):
+        pos = (len(values) - 1) * q
+        lo = int(pos)
+        hi = min(lo + 1, len(values) - 1)
+        result.append(values[lo] + (values[hi] - values[lo]) * (pos - lo))
+    return result
+
+def build_group_stats(conn):
+    # 每次导入后按当前数据重建各年份的国家、地区统计，看板直接读取，无需逐行计算
+    groups = {group_col: {} for group_col in stats_tables}
+    for year, country, region, *scores in conn.execute(
+        f'SELECT YEAR, COUNTRY, REGION, {", ".join(score_columns)} FROM qs_rankings'
+    ):
+        if country:
+            groups['COUNTRY'].setdefault((year, country, region), []).append(scores)
+        if region:
+            groups['REGION'].setdefault((year, region), []).append(scores)
+    with conn:
+        for group_col, table in stats_tables.items():
+            conn.execute(f'DELETE FROM {table}')
+            rows = []
+            for key, members in groups[group_col].items():
+                for i, metric in enumerate(score_columns):
+                    values = [scores[i] for scores in members if scores[i] is not None]
+                    if values:
+                        stats = [sum(values) / len(values), *quartiles(values)]
+                    else:
+                        stats = [None] * 6
+                    rows.append((*key, metric, len(members), len(values), *stats))
+            if rows:
+                conn.executemany(f'INSERT INTO {table} VALUES ({", ".join("?" * len(rows[0]))})', rows)
+
+def create_indexes(conn):
+    # 数据写完后再建索引，比边插入边维护索引快；ANALYZE 为查询规划器收集统计信息
     cur = conn.cursor()
-    region_missing_count = 0
-    for file in excel_files:
-        year = int(file[:4])
-        wb = openpyxl.load_workbook(file)
-        ws = wb.active
-        header = [cell.value for cell in next(ws.iter_rows(min_row=1, max_row=1))]
+    for name, definition in indexes.items():
+        cur.execute(f'CREATE INDEX IF NOT EXISTS {name} ON qs_rankings {definition}')
+    cur.execute('ANALYZE')
+    conn.commit()
+
+# Excel 表头与数据库列的对应关系：'TOTAL_SCORE' <-> 'TOTAL SCORE'
+def excel_header(col):
+    return col.replace('_', ' ')
+
+# 每批 executemany 的行数，内存占用只与批大小有关
+batch_size = 500
+
+def resolve_columns(header, year):
+    # 每个 sheet 只解析一次表头，得到各列在行元组中的下标；本年份缺失的字段为 None
+    header_index = {}
+    for idx, name in enumerate(header):
+        if name is not None and name not in header_index:
+            header_index[str(name).strip()] = idx
+    column_index = {}
+    for col in columns:
+        if col in ('YEAR', 'REGION') or col in missing_fields[year]:
+            column_index[col] = None
+        else:
+            column_index[col] = header_index.get(excel_header(col))
+    return column_index
+
+def iter_year_rows(file, year, stats):
+    # 以只读模式逐行读取，直接产出按 row_columns 排列的元组
+    wb = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        column_index = resolve_columns(header, year)
+        getters = [(col, column_index[col]) for col in columns]
         seen = set()  # 用于去重
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            row_dict = dict(zip(header, row))
+        for row in rows:
+            data = {}
+            for col, idx in getters:
+                data[col] = row[idx] if idx is not None and idx < len(row) else None
             # 跳过无效行
-            if not row_dict.get('NAME') or not row_dict.get('COUNTRY'):
+            if not data['NAME'] or not data['COUNTRY']:
                 continue
-            key = (row_dict.get('NAME'), year)
-            if key in seen:
+            # 统一空白：'Maastricht University ' / 'Universität  Leipzig'
+            data['NAME'] = ' '.join(str(data['NAME']).split())
+            data['COUNTRY'] = ' '.join(str(data['COUNTRY']).split())
+            if data['NAME'] in seen:
                 continue
-            seen.add(key)
-            country = row_dict.get('COUNTRY')
-            region = get_region(country)
-            if not region:
-                region_missing_count += 1
-            data = {
-                'RANK': row_dict.get('RANK'),
-                'NAME': row_dict.get('NAME'),
-                'COUNTRY': country,
-                'YEAR': year,
-                'REGION': region,
-                'TOTAL_SCORE': row_dict.get('TOTAL SCORE'),
-                'AR_SCORE': row_dict.get('AR SCORE'),
-                'AR_RANK': row_dict.get('AR RANK'),
-                'ER_SCORE': row_dict.get('ER SCORE'),
-                'ER_RANK': row_dict.get('ER RANK'),
-                'FSR_SCORE': row_dict.get('FSR SCORE'),
-                'FSR_RANK': row_dict.get('FSR RANK'),
-                'CPF_SCORE': row_dict.get('CPF SCORE'),
-                'CPF_RANK': row_dict.get('CPF RANK'),
-                'IFR_SCORE': row_dict.get('IFR SCORE'),
-                'IFR_RANK': row_dict.get('IFR RANK'),
-                'ISR_SCORE': row_dict.get('ISR SCORE'),
-                'ISR_RANK': row_dict.get('ISR RANK'),
-                'ISD_SCORE': row_dict.get('ISD SCORE'),
-                'ISD_RANK': row_dict.get('ISD RANK'),
-                'IRN_SCORE': row_dict.get('IRN SCORE'),
-                'IRN_RANK': row_dict.get('IRN RANK'),
-                'EO_SCORE': row_dict.get('EO SCORE'),
-                'EO_RANK': row_dict.get('EO RANK'),
-                'SUS_SCORE': row_dict.get('SUS SCORE'),
-                'SUS_RANK': row_dict.get('SUS RANK'),
-            }
-            for field in missing_fields[year]:
-                data[field] = None
-            values = [data[col] for col in columns]
-            cur.execute(
-                "INSERT INTO qs_rankings (RANK, NAME, COUNTRY, YEAR, REGION, TOTAL_SCORE, AR_SCORE, AR_RANK, ER_SCORE, ER_RANK, FSR_SCORE, FSR_RANK, CPF_SCORE, CPF_RANK, IFR_SCORE, IFR_RANK, ISR_SCORE, ISR_RANK, ISD_SCORE, ISD_RANK, IRN_SCORE, IRN_RANK, EO_SCORE, EO_RANK, SUS_SCORE, SUS_RANK) "
-                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                values
+            seen.add(data['NAME'])
+            data['YEAR'] = year
+            data['REGION'] = get_region(data['COUNTRY'])
+            if not data['REGION']:
+                stats['region_missing'] += 1
+            data['RANK'] = clean_rank_text(data['RANK'])
+            data['RANK_LO'], data['RANK_HI'], data['RANK_TIED'] = parse_rank(data['RANK'])
+            for field in score_columns:
+                data[field] = to_float(data[field])
+            for field in rank_columns:
+                data[field], data[f'{field}_HI'], data[f'{field}_TIED'] = parse_rank(data[field])
+            yield tuple(data[col] for col in row_columns)
+    finally:
+        wb.close()
+
+def insert_rows(conn, rows):
+    # 分批 executemany 写入，返回写入行数
+    insert_sql = (
+        f"INSERT INTO qs_rankings ({', '.join(insert_columns)}) "
+        f"VALUES ({', '.join('?' * len(insert_columns))})"
+    )
+    cur = conn.cursor()
+    count = 0
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            break
+        cur.executemany(insert_sql, batch)
+        count += len(batch)
+    return count
+
+def tune_for_import(conn):
+    # 导入总是写在临时文件上，失败时直接丢弃，因此不需要回滚日志和 fsync
+    conn.execute('PRAGMA journal_mode = MEMORY')
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('PRAGMA temp_store = MEMORY')
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def plan_import(conn):
+    # 比对 import_manifest，返回 (需要重新导入的文件及其状态, 内容未变只需刷新记录的文件及其状态, 源文件已移除的年份)
+    # 大小和修改时间都没变的文件直接跳过，不读取内容；否则再比较内容哈希
+    # conn 为 None 表示整库重建，所有文件都需要导入；conn 只读，不修改正式数据库
+    manifest = {}
+    if conn is not None:
+        manifest = {
+            file_name: (size, mtime_ns, sha256)
+            for file_name, size, mtime_ns, sha256 in conn.execute(
+                'SELECT FILE_NAME, SIZE, MTIME_NS, SHA256 FROM import_manifest'
             )
-    conn.commit()
-    conn.close()
+        }
+    changed = {}
+    refreshed = {}
+    for file in excel_files:
+        stat = os.stat(file)
+        previous = manifest.get(file)
+        if previous and previous[:2] == (stat.st_size, stat.st_mtime_ns):
+            continue
+        sha256 = file_sha256(file)
+        if previous and previous[2] == sha256:
+            # 内容未变（如重新 checkout 导致修改时间变化），不需要重新导入
+            refreshed[file] = (stat.st_size, stat.st_mtime_ns)
+            continue
+        changed[file] = (stat.st_size, stat.st_mtime_ns, sha256)
+    removed_years = [
+        year for file_name, year in (
+            conn.execute('SELECT FILE_NAME, YEAR FROM import_manifest') if conn is not None else []
+        )
+        if file_name not in excel_files
+    ]
+    return changed, refreshed, removed_years
+
+def refresh_manifest(conn, refreshed):
+    # 在新构建的数据库中更新内容未变文件的大小和修改时间，下次导入不必再计算哈希
+    with conn:
+        conn.executemany(
+            'UPDATE import_manifest SET SIZE = ?, MTIME_NS = ? WHERE FILE_NAME = ?',
+            ((size, mtime_ns, file) for file, (size, mtime_ns) in refreshed.items())
+        )
+
+def parse_year(file):
+    # 在工作进程中解析并规整一个年份的 sheet，行数据交回主进程统一写库
+    year = int(file[:4])
+    stats = {'region_missing': 0}
+    rows = list(iter_year_rows(file, year, stats))
+    return year, rows, stats['region_missing']
+
+def parse_all_years(files, workers):
+    # 按 files 顺序产出 (文件, 行迭代器, 统计)；workers > 1 时各年份并行解析
+    if workers <= 1 or len(files) <= 1:
+        for file in files:
+            stats = {'region_missing': 0}
+            yield file, iter_year_rows(file, int(file[:4]), stats), stats
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(files))) as pool:
+        # map 按提交顺序返回结果，写库顺序（以及自增 id）与串行模式一致
+        for file, (year, rows, region_missing) in zip(files, pool.map(parse_year, files)):
+            yield file, iter(rows), {'region_missing': region_missing}
+
+def apply_changes(conn, changed, removed_years, workers):
+    for year in removed_years:
+        with conn:
+            conn.execute('DELETE FROM qs_rankings WHERE YEAR = ?', (year,))
+            conn.execute('DELETE FROM import_manifest WHERE YEAR = ?', (year,))
+        print(f'{year} 年源文件已移除，删除该年份数据')
+    region_missing_count = 0
+    university_lookup = load_university_lookup(conn)
+    # 只有主进程写库；每个年份在各自的事务中整体替换
+    for file, rows, stats in parse_all_years(list(changed), workers):
+        year = int(file[:4])
+        size, mtime_ns, sha256 = changed[file]
+        with conn:
+            conn.execute('DELETE FROM qs_rankings WHERE YEAR = ?', (year,))
+            count = insert_rows(conn, assign_university_ids(conn, university_lookup, rows))
+            conn.execute(
+                'INSERT OR REPLACE INTO import_manifest '
+                '(FILE_NAME, YEAR, SIZE, MTIME_NS, SHA256, ROW_COUNT, IMPORTED_AT) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (file, year, size, mtime_ns, sha256, count, datetime.now().isoformat(timespec='seconds'))
+            )
+        region_missing_count += stats['region_missing']
+        print(f'{file}: {count} 行')
     print(f'未能归类地区的高校数量: {region_missing_count}')
 
+def write_snapshot_id(conn):
+    # 快照 id = 构建时间 + 各源文件内容哈希的摘要，每次发布新数据库都会变化
+    digest = hashlib.sha256()
+    for (sha256,) in conn.execute('SELECT SHA256 FROM import_manifest ORDER BY FILE_NAME'):
+        digest.update(sha256.encode())
+    snapshot_id = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{digest.hexdigest()[:12]}"
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO db_meta (KEY, VALUE) VALUES ('snapshot_id', ?)", (snapshot_id,))
+    return snapshot_id
+
+def validate_database(conn):
+    # 发布前校验：文件完整、每个源文件都有数据且行数与导入记录一致
+    if conn.execute('PRAGMA integrity_check').fetchone()[0] != 'ok':
+        raise RuntimeError('数据库完整性检查失败')
+    if conn.execute('PRAGMA user_version').fetchone()[0] != schema_version:
+        raise RuntimeError('数据库结构版本不一致')
+    if conn.execute('SELECT COUNT(*) FROM qs_rankings WHERE UNIV_ID IS NULL').fetchone()[0]:
+        raise RuntimeError('存在未关联高校维表的记录')
+    year_counts = dict(conn.execute('SELECT YEAR, COUNT(*) FROM qs_rankings GROUP BY YEAR'))
+    manifest = {
+        file_name: (year, row_count)
+        for file_name, year, row_count in conn.execute('SELECT FILE_NAME, YEAR, ROW_COUNT FROM import_manifest')
+    }
+    for file in excel_files:
+        if file not in manifest:
+            raise RuntimeError(f'{file} 没有导入记录')
+        year, row_count = manifest[file]
+        if not row_count or year_counts.get(year) != row_count:
+            raise RuntimeError(f'{file} 行数不一致：导入记录 {row_count}，数据库 {year_counts.get(year)}')
+    # 分组统计覆盖每所有国家（地区）信息的高校
+    for group_col, table in stats_tables.items():
+        stats_counts = dict(conn.execute(
+            f"SELECT YEAR, SUM(UNIVERSITIES) FROM {table} WHERE METRIC = 'TOTAL_SCORE' GROUP BY YEAR"
+        ))
+        grouped_counts = dict(conn.execute(
+            f"SELECT YEAR, COUNT(*) FROM qs_rankings WHERE {group_col} <> '' GROUP BY YEAR"
+        ))
+        if stats_counts != grouped_counts:
+            raise RuntimeError(f'{table} 与排名数据的高校数不一致')
+
+def publish_snapshot(tmp_path):
+    # 先落盘再原子替换：正在读取的看板进程要么读到旧库，要么读到完整的新库
+    # mkstemp 创建的文件权限为 0600，改为常规数据文件权限，其他用户运行的看板也能读取
+    os.chmod(tmp_path, 0o644)
+    with open(tmp_path, 'rb+') as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, db_path)
+    if hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(data_dir, os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+def read_snapshot_id(conn):
+    row = conn.execute("SELECT VALUE FROM db_meta WHERE KEY = 'snapshot_id'").fetchone()
+    return row[0] if row else None
+
+def parquet_snapshot_id():
+    marker = os.path.join(parquet_dir, '_SNAPSHOT')
+    if not os.path.exists(marker):
+        return None
+    with open(marker, encoding='utf-8') as f:
+        return f.read().strip()
+
+def arrow_schema(conn, snapshot_id):
+    # 与 qs_rankings 的列类型一一对应：REAL -> float64，排名 -> int32，并列标记 -> bool
+    fields = []
+    for _, name, declared_type, *_ in conn.execute('PRAGMA table_info(qs_rankings)'):
+        if name.endswith('_TIED'):
+            field_type = pa.bool_()
+        elif declared_type == 'REAL':
+            field_type = pa.float64()
+        elif declared_type == 'INTEGER':
+            field_type = pa.int64() if name in ('id', 'YEAR', 'UNIV_ID') else pa.int32()
+        else:
+            field_type = pa.string()
+        fields.append(pa.field(name, field_type))
+    return pa.schema(fields, metadata={'snapshot_id': snapshot_id})
+
+def export_parquet(conn, snapshot_id):
+    # 在临时目录中按年份写出 Parquet，返回临时目录路径
+    schema = arrow_schema(conn, snapshot_id)
+    tmp_dir = tempfile.mkdtemp(prefix='qs_rankings_parquet.', suffix='.tmp', dir=data_dir)
+    try:
+        years = [year for (year,) in conn.execute('SELECT DISTINCT YEAR FROM qs_rankings ORDER BY YEAR')]
+        for year in years:
+            rows = conn.execute('SELECT * FROM qs_rankings WHERE YEAR = ? ORDER BY id', (year,)).fetchall()
+            arrays = []
+            for field, values in zip(schema, zip(*rows)):
+                if field.type == pa.bool_():
+                    values = [None if v is None else bool(v) for v in values]
+                arrays.append(pa.array(values, type=field.type))
+            table = pa.Table.from_arrays(arrays, schema=schema)
+            os.makedirs(os.path.join(tmp_dir, f'YEAR={year}'))
+            pq.write_table(table, os.path.join(tmp_dir, f'YEAR={year}', 'part-0.parquet'))
+        with open(os.path.join(tmp_dir, '_SNAPSHOT'), 'w', encoding='utf-8') as f:
+            f.write(snapshot_id)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return tmp_dir
+
+def publish_parquet(tmp_dir):
+    # 目录无法原子覆盖：先移走旧目录再换入新目录；
+    # 看板只在 _SNAPSHOT 与数据库快照一致时读取 Parquet，切换间隙会回退到 SQLite
+    os.chmod(tmp_dir, 0o755)
+    old_dir = None
+    if os.path.exists(parquet_dir):
+        old_dir = f'{tmp_dir}.old'
+        os.replace(parquet_dir, old_dir)
+    os.replace(tmp_dir, parquet_dir)
+    if old_dir:
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+def sync_parquet_export():
+    # 列式副本缺失或落后于当前数据库时重新导出
+    if pa is None:
+        print('未安装 pyarrow，跳过 Parquet 导出')
+        return
+    conn = sqlite3.connect(db_path)
+    try:
+        snapshot_id = read_snapshot_id(conn)
+        if snapshot_id is None or snapshot_id == parquet_snapshot_id():
+            return
+        tmp_dir = export_parquet(conn, snapshot_id)
+    finally:
+        conn.close()
+    publish_parquet(tmp_dir)
+    print(f'已导出 Parquet: {parquet_dir}')
+
+def import_excel_to_db(workers=1, full=False):
+    os.makedirs(data_dir, exist_ok=True)
+    rebuild = needs_rebuild(full)
+    if rebuild:
+        changed, refreshed, removed_years = plan_import(None)
+    else:
+        # 正式数据库只读打开：不改动文件内容、修改时间和 inode，看板的缓存键保持不变
+        live_conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+        try:
+            changed, refreshed, removed_years = plan_import(live_conn)
+        finally:
+            live_conn.close()
+    if not changed and not removed_years:
+        # 只有修改时间变化时不发布新快照；下次导入会重新比较这些文件的哈希
+        print('源文件均未变化，无需导入')
+        sync_parquet_export()
+        return
+    # 新数据库先构建在同目录的临时文件中，校验通过后再替换正式文件
+    fd, tmp_path = tempfile.mkstemp(prefix='qs_rankings.', suffix='.db.tmp', dir=data_dir)
+    os.close(fd)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        if rebuild:
+            create_table(conn)
+        else:
+            live_conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+            try:
+                live_conn.backup(conn)
+            finally:
+                live_conn.close()
+        tune_for_import(conn)
+        apply_changes(conn, changed, removed_years, workers)
+        refresh_manifest(conn, refreshed)
+        create_indexes(conn)
+        refresh_universities(conn)
+        report_split_universities(conn)
+        build_name_search_index(conn)
+        build_group_stats(conn)
+        snapshot_id = write_snapshot_id(conn)
+        validate_database(conn)
+        conn.execute('PRAGMA journal_mode = DELETE')
+        conn.close()
+        publish_snapshot(tmp_path)
+    except BaseException:
+        conn.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    print(f'已发布数据库快照: {snapshot_id}')
+    sync_parquet_export()
+
 if __name__ == '__main__':
-    import_excel_to_db()
-    print('数据导入完成！') 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='将 QS 排名 Excel 导入 SQLite 数据库')
+    parser.add_argument('-j', '--workers', type=int, default=1,
+                        help='并行解析工作簿的进程数，0 表示使用全部 CPU 核心（默认 1，串行）')
+    parser.add_argument('--full', action='store_true',
+                        help='忽略导入记录，重建整个数据库')
+    args = parser.parse_args()
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    import_excel_to_db(workers=workers, full=args.full)
+    print('数据导入完成！')
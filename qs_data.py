@@ -0,0 +1,796 @@
+# Query layer over one QS rankings snapshot, independent of Streamlit.
+# The dashboard, batch jobs and notebooks load a QSDataset and call its query methods:
+#
+#   import qs_data
+#   dataset = qs_data.load_dataset()
+#   dataset.filter_by(2026, ['Asia'], ['Japan'])
+#   dataset.university_history(dataset.search_names('tsinghua')[0].univ_id)
+#
+# Results are memoized per dataset and shared between callers: treat returned frames as read-only.
+import functools
+import glob
+import heapq
+import inspect
+import math
+import os
+import re
+import sqlite3
+import unicodedata
+import warnings
+from collections import Counter
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+# Indicator definitions
+INDICATORS = [
+    ("Academic Reputation", "AR_SCORE", "AR_RANK"),
+    ("Employer Reputation", "ER_SCORE", "ER_RANK"),
+    ("Faculty Student", "FSR_SCORE", "FSR_RANK"),
+    ("Citations per Faculty", "CPF_SCORE", "CPF_RANK"),
+    ("International Faculty", "IFR_SCORE", "IFR_RANK"),
+    ("International Students", "ISR_SCORE", "ISR_RANK"),
+    ("International Students Diversity", "ISD_SCORE", "ISD_RANK"),
+    ("International Research Network", "IRN_SCORE", "IRN_RANK"),
+    ("Employment Outcomes", "EO_SCORE", "EO_RANK"),
+    ("Sustainability", "SUS_SCORE", "SUS_RANK")
+]
+SCORE_COLUMNS = [score_col for _, score_col, _ in INDICATORS]
+# Columns summarized by group aggregates
+AGGREGATE_COLUMNS = ['TOTAL_SCORE'] + SCORE_COLUMNS
+
+# Column dtypes written by the importer: REAL scores, INTEGER ranks (NULL when missing)
+COLUMN_DTYPES = {"YEAR": "int64", "UNIV_ID": "int64", "TOTAL_SCORE": "float64"}
+COLUMN_DTYPES.update({"RANK_LO": "Int32", "RANK_HI": "Int32", "RANK_TIED": "boolean"})
+for _, score_col, rank_col in INDICATORS:
+    COLUMN_DTYPES[score_col] = "float64"
+    COLUMN_DTYPES[rank_col] = "Int32"
+    COLUMN_DTYPES[f"{rank_col}_HI"] = "Int32"
+    COLUMN_DTYPES[f"{rank_col}_TIED"] = "boolean"
+
+DB_PATH = "data/qs_rankings.db"
+# Columnar copy written by the importer, one Parquet file per year, tagged with the snapshot id
+PARQUET_DIR = "data/qs_rankings_parquet"
+
+@dataclass(frozen=True)
+class NameMatch:
+    univ_id: int
+    name: str
+
+@dataclass(frozen=True)
+class GroupAggregate:
+    # Statistics of a group of universities per score column (AGGREGATE_COLUMNS);
+    # NaN where no university in the group has a value
+    count: int
+    mean: pd.Series
+    min: pd.Series
+    p25: pd.Series
+    median: pd.Series
+    p75: pd.Series
+    max: pd.Series
+
+@dataclass(frozen=True)
+class SelectionSummary:
+    # Number of universities in a selection and their mean total score (None when nobody has one)
+    count: int
+    mean_total_score: float
+
+# Per-year group statistics written by the importer: group column -> table
+GROUP_STATS_TABLES = {"COUNTRY": "country_stats", "REGION": "region_stats"}
+
+def connect_readonly(db_path=DB_PATH):
+    return sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+
+def get_db_identity(db_path=DB_PATH):
+    # Cheap per-call check: the importer swaps in a new file, which changes inode, mtime and usually size
+    try:
+        stat = os.stat(db_path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+@functools.lru_cache(maxsize=4)
+def read_snapshot_id(identity, db_path=DB_PATH):
+    # Snapshot id recorded by the importer in db_meta; databases without one are keyed on the file identity
+    try:
+        conn = connect_readonly(db_path)
+        try:
+            row = conn.execute("SELECT VALUE FROM db_meta WHERE KEY = 'snapshot_id'").fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        row = None
+    return row[0] if row else "file-{}-{}-{}".format(*identity)
+
+def get_snapshot_id(db_path=DB_PATH):
+    # Only re-reads db_meta when the file itself changed
+    identity = get_db_identity(db_path)
+    if identity is None:
+        return None
+    return read_snapshot_id(identity, db_path)
+
+def load_parquet(snapshot_id, parquet_dir=PARQUET_DIR):
+    # Fast path: memory-map the typed Parquet partitions instead of building the frame row by row.
+    # Returns None (fall back to SQLite) when pyarrow is missing or the export is from another snapshot.
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        return None
+    files = sorted(glob.glob(os.path.join(parquet_dir, "YEAR=*", "*.parquet")))
+    if snapshot_id is None or not files:
+        return None
+    tables = []
+    for path in files:
+        try:
+            table = pq.read_table(path, memory_map=True)
+        except (OSError, pa.ArrowException):
+            return None
+        if (table.schema.metadata or {}).get(b"snapshot_id") != snapshot_id.encode():
+            return None
+        tables.append(table)
+    # Nullable ranks and tie flags map to the same pandas dtypes as the SQLite path
+    types = {pa.int32(): pd.Int32Dtype(), pa.bool_(): pd.BooleanDtype()}
+    return pa.concat_tables(tables).to_pandas(types_mapper=types.get)
+
+def load_frame(snapshot_id, db_path=DB_PATH, parquet_dir=PARQUET_DIR):
+    # Rows ordered by year, then import order, on both paths; empty when the database is missing
+    df = load_parquet(snapshot_id, parquet_dir)
+    if df is not None:
+        return df
+    if not os.path.exists(db_path):
+        return pd.DataFrame()
+    conn = connect_readonly(db_path)
+    try:
+        return pd.read_sql_query("SELECT * FROM qs_rankings ORDER BY YEAR, id", conn, dtype=COLUMN_DTYPES)
+    finally:
+        conn.close()
+
+def load_name_terms(db_path=DB_PATH):
+    # (UNIV_ID, TERM) pairs of the importer's name search table: folded names, short names and acronyms.
+    # None when the database has no such table.
+    if not os.path.exists(db_path):
+        return None
+    try:
+        conn = connect_readonly(db_path)
+        try:
+            return conn.execute("SELECT UNIV_ID, TERM FROM university_search").fetchall()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+
+def load_group_stats(db_path=DB_PATH):
+    # The importer's country_stats and region_stats tables (one row per year, group and score column),
+    # keyed by group column; None when the database predates them
+    if not os.path.exists(db_path):
+        return None
+    try:
+        conn = connect_readonly(db_path)
+        try:
+            return {
+                group_col: pd.read_sql_query(f"SELECT * FROM {table}", conn)
+                for group_col, table in GROUP_STATS_TABLES.items()
+            }
+        finally:
+            conn.close()
+    except (sqlite3.Error, pd.errors.DatabaseError):
+        return None
+
+def compute_group_stats(frame, group_col):
+    # Same table as the importer's, computed from the rows (for databases written before it existed)
+    keys = ['YEAR', group_col] + (['REGION'] if group_col != 'REGION' else [])
+    grouped = frame[frame[group_col].fillna('') != ''].groupby(keys, dropna=False)
+    parts = []
+    for metric in AGGREGATE_COLUMNS:
+        scores = grouped[metric]
+        part = pd.DataFrame({
+            'UNIVERSITIES': grouped.size(), 'N': scores.count(), 'MEAN': scores.mean(), 'MIN': scores.min(),
+            'P25': scores.quantile(0.25), 'MEDIAN': scores.median(), 'P75': scores.quantile(0.75), 'MAX': scores.max()
+        }).reset_index()
+        part.insert(len(keys), 'METRIC', metric)
+        parts.append(part)
+    return pd.concat(parts, ignore_index=True)
+
+def load_dataset(db_path=DB_PATH, parquet_dir=PARQUET_DIR, snapshot_id=None):
+    if snapshot_id is None:
+        snapshot_id = get_snapshot_id(db_path)
+    frame = load_frame(snapshot_id, db_path, parquet_dir)
+    return QSDataset(snapshot_id, frame, db_path, load_name_terms(db_path), load_group_stats(db_path))
+
+# SQL-backed queries for batch callers that need a few slices without loading a whole QSDataset.
+# Each one runs on one of the importer's qs_rankings indexes (year/rank, year/region/rank,
+# year/country/rank, name/year, university/year) and returns rows in the same order as the dataset.
+# Unranked rows last, ties in import order: the order the rank indexes store rows in, so no query
+# sorts its results (the indexes do not cover SELECT *, so each row is still read from the table)
+RANK_ORDER = "RANK_LO NULLS LAST, id"
+
+def sql_placeholders(values):
+    return ", ".join("?" * len(values))
+
+def run_query(sql, params=(), db_path=DB_PATH):
+    conn = connect_readonly(db_path)
+    try:
+        return pd.read_sql_query(sql, conn, params=params, dtype=COLUMN_DTYPES)
+    finally:
+        conn.close()
+
+def query_filtered(year, regions=None, countries=(), db_path=DB_PATH):
+    # Same rows as QSDataset.filter_by
+    sql = "SELECT * FROM qs_rankings WHERE YEAR = ?"
+    params = [int(year)]
+    if regions is not None:
+        sql += f" AND REGION IN ({sql_placeholders(regions)})"
+        params += list(regions)
+    if countries:
+        sql += f" AND COUNTRY IN ({sql_placeholders(countries)})"
+        params += list(countries)
+    return run_query(f"{sql} ORDER BY {RANK_ORDER}", params, db_path)
+
+def query_rank_window(year, start_rank, end_rank, db_path=DB_PATH):
+    # Same rows as QSDataset.rank_window_peers: banded ranks overlapping the window, open-ended ranks unbounded
+    return run_query(
+        "SELECT * FROM qs_rankings WHERE YEAR = ? AND RANK_LO <= ? AND (RANK_HI IS NULL OR RANK_HI >= ?) "
+        f"ORDER BY {RANK_ORDER}",
+        (int(year), end_rank, start_rank), db_path
+    )
+
+def query_name(name, year=None, db_path=DB_PATH):
+    # Rows published under exactly this name (substring and fuzzy search go through NameIndex)
+    sql = "SELECT * FROM qs_rankings WHERE NAME = ?"
+    params = [name]
+    if year is not None:
+        sql += " AND YEAR = ?"
+        params.append(int(year))
+    return run_query(f"{sql} ORDER BY YEAR, id", params, db_path)
+
+def query_history(univ_id, db_path=DB_PATH):
+    # Same rows as QSDataset.university_history
+    return run_query("SELECT * FROM qs_rankings WHERE UNIV_ID = ? ORDER BY YEAR, id", (int(univ_id),), db_path)
+
+def query_names(text, limit=5, db_path=DB_PATH):
+    # Universities whose name or alias contains text, through the importer's FTS5 trigram index, ranked as
+    # NameIndex.search ranks substring matches (prefix first, then earlier matches, then shorter names).
+    # Input shorter than a trigram falls back to LIKE; typo tolerance needs the in-memory NameIndex.
+    term = normalize_query(text)
+    if not term:
+        return []
+    if len(term) >= 3:
+        condition, pattern = "university_search MATCH ?", '"' + term.replace('"', '""') + '"'
+    else:
+        condition, pattern = "TERM LIKE ? ESCAPE '\\'", "%" + re.sub(r'([%_\\])', r'\\\1', term) + "%"
+    conn = connect_readonly(db_path)
+    try:
+        rows = conn.execute(
+            "SELECT UNIV_ID, NAME FROM ("
+            f"  SELECT UNIV_ID, NAME, MIN(instr(TERM, ?)) - 1 AS POSITION FROM university_search WHERE {condition} GROUP BY UNIV_ID"
+            ") ORDER BY POSITION > 0, POSITION, length(NAME), NAME LIMIT ?",
+            (term, pattern, limit)
+        ).fetchall()
+    finally:
+        conn.close()
+    return [NameMatch(int(univ_id), name) for univ_id, name in rows]
+
+def fold_text(text):
+    # Same folding as the importer's search terms: strip accents and case-fold ('Universität' -> 'universitat')
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+
+def normalize_query(text):
+    return " ".join(fold_text(text).split())
+
+def split_words(text):
+    return re.findall(r'\w+', text)
+
+def fuzzy_words(text):
+    # Words compared by the fuzzy matcher; a leading article is ignored, as in the importer's name key
+    # ('The University of Tokyo' / 'University of Tokyo')
+    words = split_words(text)
+    return words[1:] if words[:1] == ['the'] and len(words) > 1 else words
+
+def edit_similarity(a, b):
+    # 1 - edit distance / longer length, where swapping two adjacent letters is one edit
+    # ('oxfrod' ~ 'oxford' 0.83, 'tokio' ~ 'tokyo' 0.8 but ~ 'tokai' 0.6)
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        previous2, previous = previous, current
+    return 1 - previous[len(b)] / max(len(a), len(b), 1)
+
+def padded_trigrams(word):
+    # Trigrams of the word padded with two leading and one trailing space, so short words and
+    # word starts still yield several grams ('yale' -> '  y', ' ya', 'yal', 'ale', 'le ')
+    padded = f"  {word} "
+    return {padded[start:start + 3] for start in range(len(padded) - 2)}
+
+class NameIndex:
+    # Suggestion index over folded university names and aliases, built once per dataset.
+    # Postings map every 1-3 character gram to the terms containing it, so a lookup only
+    # visits terms that share all of the input's trigrams instead of scanning every name.
+    # Input that no name contains (typos such as 'Tsinghau', 'Oxfrod') falls back to word similarity:
+    # padded word trigrams pick candidate words, edit similarity pairs them with the input words, and
+    # each name scores the weighted F1 of the pairing (see fuzzy_scores).
+    GRAM = 3
+    # Dice coefficient of padded trigrams a name word needs to be compared with an input word
+    FUZZY_CANDIDATE = 0.2
+    # Edit similarity an input word needs to count as a (misspelled) name word
+    FUZZY_WORD = 0.75
+    # Weighted F1 a name needs to count as a fuzzy match, and the share of the input's weight it must
+    # pair (a rare typed word missing from the name rules it out: 'Shanghai Jiaotong' is not 'Shanghai University')
+    FUZZY_THRESHOLD = 0.6
+    FUZZY_RECALL = 0.6
+    # Fuzzy matches scoring within this margin of the best one are equally likely, so none of them is
+    # picked for the input on its own
+    FUZZY_MARGIN = 0.05
+
+    def __init__(self, terms, names):
+        self.names = names
+        self.terms = []
+        self.term_ids = []
+        self.postings = {}
+        # Exact name/alias -> university ids, for resolving input to one university
+        self.exact = {}
+        # Word -> numbers of the terms using it, and padded word trigram -> words, for fuzzy lookups
+        self.word_terms = {}
+        self.word_postings = {}
+        # Distinct words of each term
+        self.term_words = []
+        for univ_id, term in terms:
+            if univ_id not in names:
+                continue
+            number = len(self.terms)
+            self.terms.append(term)
+            self.term_ids.append(univ_id)
+            self.exact.setdefault(term, []).append(univ_id)
+            for size in range(1, self.GRAM + 1):
+                for start in range(len(term) - size + 1):
+                    self.postings.setdefault(term[start:start + size], set()).add(number)
+            self.term_words.append(set(fuzzy_words(term)))
+            for word in self.term_words[number]:
+                self.word_terms.setdefault(word, set()).add(number)
+        for word in self.word_terms:
+            for gram in padded_trigrams(word):
+                self.word_postings.setdefault(gram, set()).add(word)
+        # Inverse term frequency of each word: 'university', 'of' and 'the' weigh little, 'oxford' a lot.
+        # Input words that match no name word weigh as much as the rarest word.
+        self.word_weights = {
+            word: math.log(1 + len(self.terms) / len(numbers)) for word, numbers in self.word_terms.items()
+        }
+        self.unknown_weight = math.log(1 + len(self.terms))
+        self.term_weights = [sum(self.word_weights[word] for word in words) for words in self.term_words]
+
+    def candidates(self, term):
+        # Numbers of the terms containing term
+        if len(term) <= self.GRAM:
+            return self.postings.get(term, ())
+        grams = [term[start:start + self.GRAM] for start in range(len(term) - self.GRAM + 1)]
+        postings = sorted((self.postings.get(gram, ()) for gram in set(grams)), key=len)
+        if not postings[0]:
+            return ()
+        found = set(postings[0]).intersection(*postings[1:])
+        return [number for number in found if term in self.terms[number]]
+
+    def match_positions(self, text, univ_ids=None):
+        # University id -> earliest position of text in any of its names or aliases,
+        # over the universities in univ_ids (None = all)
+        term = normalize_query(text)
+        best = {}
+        if not term:
+            return best
+        for number in self.candidates(term):
+            position = self.terms[number].find(term)
+            univ_id = self.term_ids[number]
+            if univ_ids is not None and univ_id not in univ_ids:
+                continue
+            if position < best.get(univ_id, position + 1):
+                best[univ_id] = position
+        return best
+
+    def similar_words(self, word):
+        # Name word -> edit similarity (FUZZY_WORD-1) for the words sharing enough padded trigrams with word
+        grams = padded_trigrams(word)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.word_postings.get(gram, ()))
+        similar = {}
+        for candidate, count in shared.items():
+            if 2 * count / (len(grams) + len(padded_trigrams(candidate))) >= self.FUZZY_CANDIDATE:
+                similarity = edit_similarity(word, candidate)
+                if similarity >= self.FUZZY_WORD:
+                    similar[candidate] = similarity
+        return similar
+
+    def fuzzy_scores(self, text, univ_ids=None):
+        # University id (in univ_ids, None = all) -> best weighted F1 of one of its names or aliases.
+        # Each input word is paired with its most similar word in the name; pairs count their similarity
+        # times the name word's weight. Recall: share of the input's weight that is paired;
+        # precision: share of the name's weight that is paired, so name words the input leaves out
+        # ('British' in 'University of British Columbia' for 'Columbia Universtiy') lower the score.
+        words = fuzzy_words(normalize_query(text))
+        if sum(len(word) for word in words) < self.GRAM:
+            return {}
+        # Term number -> input word position -> (similarity, name word)
+        pairs = {}
+        unpaired_weights = []
+        for position, word in enumerate(words):
+            for candidate, similarity in self.similar_words(word).items():
+                for number in self.word_terms[candidate]:
+                    paired = pairs.setdefault(number, {})
+                    if similarity > paired.get(position, (0, None))[0]:
+                        paired[position] = (similarity, candidate)
+            unpaired_weights.append(self.word_weights.get(word, self.unknown_weight))
+        best = {}
+        for number, paired in pairs.items():
+            univ_id = self.term_ids[number]
+            if univ_ids is not None and univ_id not in univ_ids:
+                continue
+            matched = sum(similarity * self.word_weights[candidate] for similarity, candidate in paired.values())
+            typed = sum(self.word_weights[paired[position][1]] if position in paired else weight
+                        for position, weight in enumerate(unpaired_weights))
+            name_words = {}
+            for similarity, candidate in paired.values():
+                name_words[candidate] = max(similarity, name_words.get(candidate, 0))
+            covered = sum(similarity * self.word_weights[candidate] for candidate, similarity in name_words.items())
+            recall = matched / typed
+            if recall < self.FUZZY_RECALL:
+                continue
+            precision = covered / self.term_weights[number]
+            score = 2 * recall * precision / (recall + precision)
+            if score >= self.FUZZY_THRESHOLD and score > best.get(univ_id, 0):
+                best[univ_id] = score
+        return best
+
+    def ranked_matches(self, text, univ_ids=None):
+        # University id -> rank key: substring matches by position (prefix first);
+        # only when nothing contains the input, fuzzy matches by similarity
+        best = self.match_positions(text, univ_ids)
+        if best:
+            return {univ_id: (position > 0, position) for univ_id, position in best.items()}
+        return {univ_id: (True, -score) for univ_id, score in self.fuzzy_scores(text, univ_ids).items()}
+
+    def matching_ids(self, text, univ_ids=None):
+        # Every university containing the input; failing that, the most similar ones (within FUZZY_MARGIN)
+        best = self.match_positions(text, univ_ids)
+        if best:
+            return set(best)
+        scores = self.fuzzy_scores(text, univ_ids)
+        top = max(scores.values(), default=None)
+        return {univ_id for univ_id, score in scores.items() if score > top - self.FUZZY_MARGIN}
+
+    def resolve(self, text, univ_ids=None):
+        # The one university (in univ_ids, None = all) meant by text: the only one with that exact
+        # name or alias, else the only one containing it, else the only fuzzy match within FUZZY_MARGIN
+        # of the best. None when nothing matches or several do equally well ('University of California');
+        # search() then lists the candidates. An exact name of a university outside univ_ids names that
+        # university, not a similar one ('University of Oxford' is never 'Oxford Brookes University').
+        named = self.exact.get(normalize_query(text), ())
+        exact = {univ_id for univ_id in named if univ_ids is None or univ_id in univ_ids}
+        matches = exact if named else self.matching_ids(text, univ_ids)
+        if len(matches) != 1:
+            return None
+        univ_id, = matches
+        return NameMatch(univ_id, self.names[univ_id])
+
+    def search(self, text, limit=5, univ_ids=None):
+        # Top matches (in univ_ids, None = all), ties broken by shorter names
+        ranked = self.ranked_matches(text, univ_ids)
+        top = heapq.nsmallest(limit, ranked.items(), key=lambda item: (
+            item[1], len(self.names[item[0]]), self.names[item[0]]
+        ))
+        return [NameMatch(univ_id, self.names[univ_id]) for univ_id, _ in top]
+
+def sort_by_rank(df):
+    # Unranked rows last, ties (and banded ranks) in import order
+    return df.sort_values('RANK_LO', na_position='last', kind='stable')
+
+def merge_positions(indexes, keys):
+    # Sorted union of the row positions of several keys (each position belongs to one key)
+    parts = [indexes[key] for key in keys if key in indexes]
+    return np.sort(np.concatenate(parts)) if parts else np.array([], dtype=np.intp)
+
+def page_rows(df, sort_by=None, ascending=True, page=1, page_size=50, rank_ordered=False):
+    # One page (1-based) of df, optionally re-sorted on one column; missing values always sort last.
+    # rank_ordered: df is already in sort_by_rank order (e.g. from filter_by), so an ascending rank sort is skipped
+    if sort_by == 'RANK_LO' and ascending and rank_ordered:
+        sort_by = None
+    if sort_by is not None:
+        df = df.sort_values(sort_by, ascending=ascending, na_position='last', kind='stable')
+    start = (page - 1) * page_size
+    return df.iloc[start:start + page_size]
+
+def score_matrix(df):
+    # Universities x AGGREGATE_COLUMNS, missing scores as NaN
+    return df[AGGREGATE_COLUMNS].to_numpy('float64', na_value=np.nan)
+
+def aggregate_matrix(values):
+    # Every statistic for every column in one vectorized pass over a score matrix
+    count = len(values)
+    if not count:
+        values = np.full((1, len(AGGREGATE_COLUMNS)), np.nan)
+    with warnings.catch_warnings():
+        # Columns with no values in the group give NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        mean = np.nanmean(values, axis=0)
+        quantiles = np.nanpercentile(values, [0, 25, 50, 75, 100], axis=0)
+    stats = [pd.Series(row, index=AGGREGATE_COLUMNS) for row in [mean, *quantiles]]
+    return GroupAggregate(count, *stats)
+
+def aggregate(df):
+    return aggregate_matrix(score_matrix(df))
+
+def memoized(maxsize=256):
+    # Per-dataset LRU cache, released together with the dataset.
+    # Arguments are bound to the method's signature (defaults filled in), so positional and keyword
+    # calls share entries; list arguments are frozen to tuples so widget values can be passed as they are.
+    def decorate(method):
+        signature = inspect.signature(method)
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            cache = self._caches.get(method.__name__)
+            if cache is None:
+                cache = self._caches[method.__name__] = functools.lru_cache(maxsize)(functools.partial(method, self))
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            values = list(bound.arguments.values())[1:]
+            return cache(*(tuple(value) if isinstance(value, list) else value for value in values))
+        return wrapper
+    return decorate
+
+class QSDataset:
+    # One database snapshot, preprocessed once and shared by every caller.
+    # Treat all attributes and query results as read-only: callers select or copy, never assign into them.
+    def __init__(self, snapshot_id, frame, db_path=DB_PATH, name_terms=None, group_stats=None):
+        self.snapshot_id = snapshot_id
+        self.frame = frame
+        self.db_path = db_path
+        self._caches = {}
+        if frame.empty:
+            self.years, self.regions, self.countries = [], [], []
+            self.rows_by_year, self.rows_by_univ, self.univ_names = {}, {}, {}
+            self.row_by_univ_year, self.univ_ids_by_year = {}, {}
+            self.partitions, self.region_index, self.country_index = {}, {}, {}
+            self.rank_bounds, self.score_matrices, self.rank_positions = {}, {}, {}
+            self.group_stats, self.group_stats_rows = {}, {}
+            self.name_index = NameIndex([], {})
+            return
+        self.years = sorted(int(year) for year in frame['YEAR'].unique())
+        self.regions = sorted(frame['REGION'].dropna().unique())
+        self.countries = sorted(frame['COUNTRY'].dropna().unique())
+        # Row positions per year and per university (in year order)
+        self.rows_by_year = {int(year): rows for year, rows in frame.groupby('YEAR').indices.items()}
+        self.rows_by_univ = {int(univ_id): rows for univ_id, rows in frame.groupby('UNIV_ID').indices.items()}
+        # Row position of each university in each year (the importer keeps one row per university and year)
+        self.row_by_univ_year = {
+            (int(univ_id), int(year)): position
+            for position, (univ_id, year) in enumerate(zip(frame['UNIV_ID'], frame['YEAR']))
+        }
+        # Universities with a row in each year, to resolve names against one edition
+        self.univ_ids_by_year = {
+            year: frozenset(int(univ_id) for univ_id in frame['UNIV_ID'].iloc[rows])
+            for year, rows in self.rows_by_year.items()
+        }
+        # Latest name of each university
+        self.univ_names = frame.drop_duplicates('UNIV_ID', keep='last').set_index('UNIV_ID')['NAME'].to_dict()
+        # Per-year partitions sorted by rank once, with region/country -> position (within the partition)
+        # indexes, so filters are index intersections without masks or re-sorting
+        self.partitions, self.region_index, self.country_index = {}, {}, {}
+        # Numeric rank bounds of each partition's ranked rows (a prefix of the partition), for
+        # binary-search rank windows; open-ended ranks (e.g. 1201+) get an infinite upper bound
+        self.rank_bounds = {}
+        # Position of every ranked university in its year's rank order: a ±N rank-neighbour peer window
+        # is then the slice around that position
+        self.rank_positions = {}
+        # Score matrix of each partition (same row order) for group aggregates
+        self.score_matrices = {}
+        for year, rows in self.rows_by_year.items():
+            part = sort_by_rank(frame.iloc[rows])
+            self.partitions[year] = part
+            self.score_matrices[year] = score_matrix(part)
+            self.region_index[year] = part.groupby('REGION').indices
+            self.country_index[year] = part.groupby('COUNTRY').indices
+            ranked = int(part['RANK_LO'].notna().sum())
+            rank_lo = part['RANK_LO'].iloc[:ranked].to_numpy('int64')
+            rank_hi = part['RANK_HI'].iloc[:ranked].to_numpy('float64', na_value=np.inf)
+            # Upper bounds follow the lower bounds in a published ranking, which makes every window one slice
+            self.rank_bounds[year] = (rank_lo, rank_hi, bool(np.all(rank_hi[1:] >= rank_hi[:-1])))
+            for position, univ_id in enumerate(part['UNIV_ID'].iloc[:ranked]):
+                self.rank_positions[(int(univ_id), year)] = position
+        # Precomputed country/region statistics per year, with (YEAR, group) -> row positions
+        if group_stats is None:
+            group_stats = {group_col: compute_group_stats(frame, group_col) for group_col in GROUP_STATS_TABLES}
+        self.group_stats = group_stats
+        self.group_stats_rows = {
+            group_col: {(int(year), name): rows for (year, name), rows in stats.groupby(['YEAR', group_col]).indices.items()}
+            for group_col, stats in group_stats.items()
+        }
+        # Name suggestions over the importer's names and aliases; without them, over every edition's name
+        if name_terms is None:
+            name_terms = {(int(univ_id), normalize_query(name))
+                          for univ_id, name in zip(frame['UNIV_ID'], frame['NAME'])}
+        self.name_index = NameIndex(sorted(name_terms), self.univ_names)
+
+    @property
+    def empty(self):
+        return self.frame.empty
+
+    def year_frame(self, year):
+        # One year's rows, sorted by rank
+        part = self.partitions.get(int(year))
+        return part if part is not None else self.frame.iloc[:0]
+
+    @memoized()
+    def filter_by(self, year, regions=None, countries=()):
+        # Universities of one year in the given regions (None = all) and countries (empty = all), by rank
+        year = int(year)
+        part = self.year_frame(year)
+        positions = None
+        if regions is not None:
+            positions = merge_positions(self.region_index.get(year, {}), regions)
+        if countries:
+            country_positions = merge_positions(self.country_index.get(year, {}), countries)
+            positions = country_positions if positions is None else np.intersect1d(positions, country_positions, assume_unique=True)
+        return part if positions is None else part.iloc[positions]
+
+    def year_univ_ids(self, year):
+        # Universities with a row in year, or None (no restriction) when year is None
+        return None if year is None else self.univ_ids_by_year.get(int(year), frozenset())
+
+    @memoized(maxsize=1024)
+    def search_names(self, text, limit=5, year=None):
+        # Ranked university matches (latest names) on names and aliases, case- and accent-insensitive
+        # and tolerant of typos; with a year, only universities ranked that year
+        return self.name_index.search(text, limit, self.year_univ_ids(year))
+
+    @memoized()
+    def match_rows(self, text, year=None):
+        # Rows of every university whose name or alias contains text (or, failing that, resembles it),
+        # joined on the stable university id so renamed editions stay together
+        univ_ids = self.name_index.matching_ids(text, self.year_univ_ids(year))
+        rows = [self.rows_by_univ[univ_id] for univ_id in univ_ids if univ_id in self.rows_by_univ]
+        if not rows:
+            return self.frame.iloc[:0]
+        df = self.frame.iloc[np.sort(np.concatenate(rows))]
+        if year is not None:
+            df = df[df['YEAR'] == int(year)]
+        return df
+
+    @memoized(maxsize=1024)
+    def resolve(self, text, year=None):
+        # NameMatch of the single university text refers to (among those ranked in year, when given),
+        # or None when nothing matches or the input is ambiguous
+        return self.name_index.resolve(text, self.year_univ_ids(year))
+
+    @memoized(maxsize=64)
+    def resolve_many(self, texts, year=None):
+        # NameMatch (or None) for each input in one call: a university id, or a name resolved as by resolve()
+        matches = []
+        for text in texts:
+            text = text.strip()
+            if text.isdigit() and int(text) in self.univ_names:
+                matches.append(NameMatch(int(text), self.univ_names[int(text)]))
+            else:
+                matches.append(self.resolve(text, year) if text else None)
+        return matches
+
+    def university_row(self, univ_id, year):
+        # One university's row in one year, or None when it is not ranked that year
+        position = self.row_by_univ_year.get((int(univ_id), int(year)))
+        return self.frame.iloc[position] if position is not None else None
+
+    def university_rows(self, univ_ids, year):
+        # Rows of several universities in one year, in the given order; universities not ranked that year are skipped
+        keys = ((int(univ_id), int(year)) for univ_id in univ_ids)
+        return self.frame.iloc[[self.row_by_univ_year[key] for key in keys if key in self.row_by_univ_year]]
+
+    @memoized()
+    def university_history(self, univ_id):
+        # Every edition of one university, oldest first
+        rows = self.rows_by_univ.get(int(univ_id))
+        return self.frame.iloc[rows] if rows is not None else self.frame.iloc[:0]
+
+    def rank_window_positions(self, year, start_rank, end_rank):
+        # Partition positions of a rank window: banded ranks (e.g. 601-650) belong to the window when
+        # the band overlaps it; an open-ended rank (e.g. 1201+) has no upper bound
+        if year not in self.rank_bounds:
+            return slice(0, 0)
+        lo, hi, hi_sorted = self.rank_bounds[year]
+        stop = int(np.searchsorted(lo, end_rank, side='right'))
+        if hi_sorted:
+            return slice(int(np.searchsorted(hi[:stop], start_rank, side='left')), stop)
+        # A source whose bands overlap out of order: compare the candidates' upper bounds instead
+        return np.flatnonzero(hi[:stop] >= start_rank)
+
+    def neighbor_positions(self, year, univ_id, size):
+        # Partition positions of the size universities ranked directly above and below a university
+        # (the university itself excluded); empty when it is not ranked that year
+        position = self.rank_positions.get((int(univ_id), year))
+        if position is None:
+            return np.array([], dtype=np.intp)
+        ranked = len(self.rank_bounds[year][0])
+        return np.r_[max(0, position - size):position, position + 1:min(ranked, position + size + 1)]
+
+    def group_positions(self, year, group):
+        # Partition positions of a group definition:
+        #   ('rank', start, end)             ranks start..end
+        #   ('neighbors', univ_id, size)     the size universities ranked directly above and below univ_id
+        #   ('country', name, ...)           countries; ('region', name, ...) regions
+        #   ('country_top', name, max_rank)  a country's universities ranked max_rank or better
+        kind, *args = group
+        if kind == 'rank':
+            return self.rank_window_positions(year, *args)
+        if kind == 'neighbors':
+            return self.neighbor_positions(year, *args)
+        if kind == 'country_top':
+            country, max_rank = args
+            positions = merge_positions(self.country_index.get(year, {}), [country])
+            lo = self.rank_bounds[year][0] if year in self.rank_bounds else np.array([], dtype=np.int64)
+            return positions[positions < np.searchsorted(lo, max_rank, side='right')]
+        index = self.country_index if kind == 'country' else self.region_index
+        return merge_positions(index.get(year, {}), args)
+
+    @memoized()
+    def group_peers(self, year, group):
+        # Rows of one year's universities in a group (see group_positions), by rank
+        return self.year_frame(year).iloc[self.group_positions(int(year), tuple(group))]
+
+    @memoized()
+    def rank_window_peers(self, year, start_rank, end_rank):
+        return self.year_frame(year).iloc[self.rank_window_positions(int(year), start_rank, end_rank)]
+
+    @memoized()
+    def country_peers(self, year, country):
+        return self.year_frame(year).iloc[self.group_positions(int(year), ('country', country))]
+
+    def stats_aggregate(self, group_col, year, name):
+        # GroupAggregate read from the precomputed statistics of one country or region
+        rows = self.group_stats_rows[group_col].get((year, name))
+        if rows is None:
+            return aggregate_matrix(np.empty((0, len(AGGREGATE_COLUMNS))))
+        stats = self.group_stats[group_col].iloc[rows].set_index('METRIC').reindex(AGGREGATE_COLUMNS)
+        return GroupAggregate(
+            int(stats['UNIVERSITIES'].max()),
+            *(stats[col].astype('float64').rename(None) for col in ['MEAN', 'MIN', 'P25', 'MEDIAN', 'P75', 'MAX'])
+        )
+
+    @memoized(maxsize=1024)
+    def group_aggregate(self, year, group):
+        # GroupAggregate of one year's universities in a group (see group_positions), e.g.
+        # dataset.group_aggregate(2026, ('rank', 1, 10)) or dataset.group_aggregate(2026, ('country', 'Japan')).
+        # A single country or region is read from the precomputed statistics.
+        year = int(year)
+        kind, *args = group
+        if kind in ('country', 'region') and len(args) == 1:
+            return self.stats_aggregate(kind.upper(), year, args[0])
+        matrix = self.score_matrices.get(year, np.empty((0, len(AGGREGATE_COLUMNS))))
+        return aggregate_matrix(matrix[self.group_positions(year, tuple(group))])
+
+    @memoized()
+    def country_aggregates(self, year):
+        # GroupAggregate per country for one year
+        year = int(year)
+        return {country: self.group_aggregate(year, ('country', country)) for country in self.country_index.get(year, {})}
+
+    @memoized()
+    def filter_summary(self, year, regions=None, countries=()):
+        # SelectionSummary of filter_by(year, regions, countries), combined from the per-country statistics
+        stats = self.group_stats['COUNTRY']
+        rows = stats[(stats['YEAR'] == int(year)) & (stats['METRIC'] == 'TOTAL_SCORE')]
+        if regions is not None:
+            rows = rows[rows['REGION'].isin(regions)]
+        if countries:
+            rows = rows[rows['COUNTRY'].isin(countries)]
+        scored = rows['N'].sum()
+        mean = (rows['MEAN'] * rows['N']).sum() / scored if scored else None
+        return SelectionSummary(int(rows['UNIVERSITIES'].sum()), mean)
+
+    @memoized()
+    def leaderboard(self, year, group_col, metric='TOTAL_SCORE'):
+        # One year's statistics of one score column per country (group_col='COUNTRY') or region, best mean first
+        stats = self.group_stats[group_col]
+        rows = stats[(stats['YEAR'] == int(year)) & (stats['METRIC'] == metric)]
+        return rows.sort_values('MEAN', ascending=False, na_position='last', kind='stable')
@@ -0,0 +1,202 @@
+# Importer tests on hand-built values and small temporary workbooks. Run from the repository root: python -m pytest
+import numpy as np
+import pandas as pd
+import pytest
+
+import import_qs_excel_to_db as importer
+import qs_data
+
+@pytest.mark.parametrize("value, expected", [
+    ("1", (1, 1, 0)),
+    ("=25", (25, 25, 1)),
+    ("601-650", (601, 650, 0)),
+    ("601–650", (601, 650, 0)),
+    (" 601 - 650 ", (601, 650, 0)),
+    ("1201+", (1201, None, 0)),
+    (42, (42, 42, 0)),
+    ("n/a", (None, None, None)),
+    (None, (None, None, None)),
+])
+def test_parse_rank(value, expected):
+    assert importer.parse_rank(value) == expected
+
+@pytest.mark.parametrize("values", [[5.0], [3.0, 1.0], [1.0, 2.0, 4.0, 8.0], [10.0, 2.5, 7.0, 7.0, 1.0, 9.5, 4.0]])
+def test_quartiles_match_numpy(values):
+    assert importer.quartiles(values) == pytest.approx(np.percentile(values, [0, 25, 50, 75, 100]))
+
+def write_workbook(path, rows):
+    # Minimal yearly workbook: rank, name, country and total score; other indicators are left out
+    workbook = importer.openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(['RANK', 'NAME', 'COUNTRY', 'TOTAL SCORE'])
+    for row in rows:
+        sheet.append(list(row))
+        # Tied ranks such as '=2' are text in the published workbooks, not formulas
+        for cell in sheet[sheet.max_row]:
+            if isinstance(cell.value, str) and cell.value.startswith('='):
+                cell.data_type = 's'
+    workbook.save(path)
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    # Two small editions in a temporary working directory; the importer resolves data/ and the workbooks from there
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(importer, 'excel_files', ['2025QSRankings.xlsx', '2026QSRankings.xlsx'])
+    write_workbook('2025QSRankings.xlsx', [
+        ('1', 'Alpha University', 'Japan', 90.0),
+        ('=2', 'Beta Institute', 'Japan', 80.0),
+        ('601-650', 'Gamma University', 'Germany', 30.0),
+    ])
+    write_workbook('2026QSRankings.xlsx', [
+        ('1', 'Alpha University', 'Japan', 91.0),
+        ('2', 'Beta Institute', 'Japan', 81.0),
+    ])
+    importer.import_excel_to_db()
+    return tmp_path
+
+def read_rows(sql, params=()):
+    conn = importer.sqlite3.connect(importer.db_path)
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+def test_import_builds_database(workspace):
+    assert read_rows('SELECT YEAR, NAME, RANK_LO, RANK_HI, RANK_TIED FROM qs_rankings ORDER BY id') == [
+        (2025, 'Alpha University', 1, 1, 0),
+        (2025, 'Beta Institute', 2, 2, 1),
+        (2025, 'Gamma University', 601, 650, 0),
+        (2026, 'Alpha University', 1, 1, 0),
+        (2026, 'Beta Institute', 2, 2, 0),
+    ]
+
+def test_incremental_import_replaces_changed_years_only(workspace):
+    before = dict(read_rows("SELECT NAME || YEAR, id FROM qs_rankings"))
+    ids = dict(read_rows('SELECT NAME, UNIV_ID FROM qs_rankings WHERE YEAR = 2025'))
+    write_workbook('2026QSRankings.xlsx', [
+        ('1', 'Beta Institute', 'Japan', 92.0),
+        ('2', 'Alpha University', 'Japan', 90.5),
+        ('3', 'Gamma University', 'Germany', 70.0),
+    ])
+    importer.import_excel_to_db()
+    after = dict(read_rows("SELECT NAME || YEAR, id FROM qs_rankings"))
+    # 2025 rows are kept as they were; 2026 is re-imported with the same university ids
+    assert {key: after[key] for key in after if key.endswith('2025')} == {key: before[key] for key in before if key.endswith('2025')}
+    assert read_rows('SELECT NAME, UNIV_ID, RANK_LO FROM qs_rankings WHERE YEAR = 2026 ORDER BY RANK_LO') == [
+        ('Beta Institute', ids['Beta Institute'], 1),
+        ('Alpha University', ids['Alpha University'], 2),
+        ('Gamma University', ids['Gamma University'], 3),
+    ]
+    assert read_rows('SELECT ROW_COUNT FROM import_manifest ORDER BY FILE_NAME') == [(3,), (3,)]
+
+def snapshot_id():
+    return read_rows("SELECT VALUE FROM db_meta WHERE KEY = 'snapshot_id'")[0][0]
+
+def test_unchanged_workbooks_leave_database_untouched(workspace):
+    before = importer.os.stat(importer.db_path)
+    # A new modification time with the same content (e.g. a fresh checkout) publishes nothing
+    importer.os.utime('2026QSRankings.xlsx', ns=(before.st_mtime_ns + 10**9, before.st_mtime_ns + 10**9))
+    importer.import_excel_to_db()
+    after = importer.os.stat(importer.db_path)
+    assert (after.st_ino, after.st_mtime_ns, after.st_size) == (before.st_ino, before.st_mtime_ns, before.st_size)
+
+def test_snapshot_swap_keeps_open_readers_on_old_snapshot(workspace):
+    old_snapshot = snapshot_id()
+    reader = importer.sqlite3.connect(importer.db_path)
+    try:
+        write_workbook('2026QSRankings.xlsx', [('1', 'Alpha University', 'Japan', 95.0)])
+        importer.import_excel_to_db()
+        # The new database replaced the file; a connection opened before still reads the complete old one
+        assert reader.execute("SELECT COUNT(*) FROM qs_rankings WHERE YEAR = 2026").fetchone()[0] == 2
+        assert reader.execute("SELECT VALUE FROM db_meta WHERE KEY = 'snapshot_id'").fetchone()[0] == old_snapshot
+    finally:
+        reader.close()
+    assert snapshot_id() != old_snapshot
+    assert read_rows("SELECT COUNT(*) FROM qs_rankings WHERE YEAR = 2026") == [(1,)]
+
+def test_failed_import_keeps_live_database(workspace, monkeypatch):
+    with open(importer.db_path, 'rb') as f:
+        before = f.read()
+    write_workbook('2026QSRankings.xlsx', [('1', 'Alpha University', 'Japan', 95.0)])
+
+    def fail(conn):
+        raise RuntimeError('validation failed')
+    monkeypatch.setattr(importer, 'validate_database', fail)
+    with pytest.raises(RuntimeError):
+        importer.import_excel_to_db()
+    with open(importer.db_path, 'rb') as f:
+        assert f.read() == before
+    assert not [name for name in importer.os.listdir(importer.data_dir) if name.endswith('.tmp')]
+
+@pytest.mark.parametrize("where", [
+    "YEAR = ?",
+    "YEAR = ? AND REGION IN (?)",
+    "YEAR = ? AND REGION IN (?, ?)",
+    "YEAR = ? AND COUNTRY IN (?)",
+    "YEAR = ? AND REGION IN (?) AND COUNTRY IN (?)",
+    "YEAR = ? AND RANK_LO <= ? AND (RANK_HI IS NULL OR RANK_HI >= ?)",
+])
+def test_rank_queries_read_index_order(workspace, where):
+    # qs_data's SQL queries come back in rank order from the indexes, without a sort step
+    plan = read_rows(f"EXPLAIN QUERY PLAN SELECT * FROM qs_rankings WHERE {where} ORDER BY {qs_data.RANK_ORDER}",
+                     [2026] + [1] * (where.count('?') - 1))
+    details = ' '.join(row[-1] for row in plan)
+    assert 'USING INDEX' in details and 'TEMP B-TREE' not in details
+
+@pytest.mark.parametrize("text", ["univ", "Alpha", "ta un", "et", "Gamma University", "zzz"])
+def test_query_names_matches_name_index(workspace, text):
+    # The FTS5 trigram search gives the in-memory index's substring ranking
+    dataset = qs_data.load_dataset(importer.db_path, importer.parquet_dir)
+    assert qs_data.query_names(text, db_path=importer.db_path) == dataset.search_names(text)
+
+@pytest.mark.parametrize("first, second, country", [
+    ("The University of Edinburgh", "University of Edinburgh", "United Kingdom"),
+    ("The University of Osaka", "Osaka University", "Japan"),
+    ("Universität Leipzig", "Leipzig University", "Germany"),
+    ("Heinrich-Heine-Universität Düsseldorf", "Heinrich-Heine-Universitaet Duesseldorf", "Germany"),
+    ("Ural Federal University - UrFU", "Ural Federal University (UrFU)", "Russia"),
+    ("Southeast University, China", "Southeast University", "China"),
+    ("Radboud University", "Radboud University Nijmegen", "Netherlands"),
+])
+def test_university_key_matches_renames(first, second, country):
+    assert importer.university_key(first, country) == importer.university_key(second, country)
+
+@pytest.mark.parametrize("first, second, country", [
+    ("University of Massachusetts - Boston", "University of Massachusetts - Amherst", "United States"),
+    ("Universidad de Los Andes Colombia", "Universidad de Los Andes Chile", "Colombia"),
+])
+def test_university_key_keeps_universities_apart(first, second, country):
+    assert importer.university_key(first, country) != importer.university_key(second, country)
+
+def test_renamed_universities_keep_one_id(workspace):
+    write_workbook('2025QSRankings.xlsx', [
+        ('1', 'Universität Leipzig', 'Germany', 60.0),
+        ('2', 'Universidad de Córdoba - Colombia', 'Colombia', 20.0),
+        ('3', 'Turkey Technical University', 'Turkey', 10.0),
+        ('4', 'Universidad de Los Andes', 'Colombia', 5.0),
+    ])
+    write_workbook('2026QSRankings.xlsx', [
+        ('1', 'Leipzig University', 'Germany', 61.0),
+        ('2', 'Universidad de Córdoba - España', 'Spain', 21.0),
+        ('3', 'Turkey Technical University', 'Türkiye', 11.0),
+        ('4', 'Universidad de Los Andes', 'Chile', 6.0),
+    ])
+    importer.import_excel_to_db(full=True)
+    univ_ids = {(year, name): univ_id for year, name, univ_id in read_rows('SELECT YEAR, NAME, UNIV_ID FROM qs_rankings')}
+    # Renamed in the same country, or under a new spelling of the country: one university
+    assert univ_ids[(2025, 'Universität Leipzig')] == univ_ids[(2026, 'Leipzig University')]
+    assert univ_ids[(2025, 'Turkey Technical University')] == univ_ids[(2026, 'Turkey Technical University')]
+    # The same name or name key in another country: two universities
+    assert univ_ids[(2025, 'Universidad de Córdoba - Colombia')] != univ_ids[(2026, 'Universidad de Córdoba - España')]
+    assert univ_ids[(2025, 'Universidad de Los Andes')] != univ_ids[(2026, 'Universidad de Los Andes')]
+
+def test_group_stats_match_rows(workspace):
+    # The importer's statistics tables equal the ones qs_data computes from the rows
+    frame = qs_data.load_frame(snapshot_id(), importer.db_path, importer.parquet_dir)
+    stored = qs_data.load_group_stats(importer.db_path)
+    for group_col in qs_data.GROUP_STATS_TABLES:
+        computed = qs_data.compute_group_stats(frame, group_col)
+        keys = ['YEAR', group_col, 'METRIC']
+        assert len(stored[group_col]) == len(computed) > 0
+        tables = [table.sort_values(keys).reset_index(drop=True)[computed.columns] for table in (stored[group_col], computed)]
+        pd.testing.assert_frame_equal(*tables, check_dtype=False)
@@ -0,0 +1,240 @@
+# qs_data tests on a small hand-built dataset. Run from the repository root: python -m pytest
+import numpy as np
+import pandas as pd
+import pytest
+
+import import_qs_excel_to_db as importer
+import qs_data
+
+# (UNIV_ID, NAME, COUNTRY, REGION, {YEAR: (RANK, TOTAL_SCORE)})
+UNIVERSITIES = [
+    (1, "Alpha University", "Japan", "Asia", {2025: ("1", 95.0), 2026: ("1", 96.0)}),
+    (2, "Beta Institute of Technology", "Japan", "Asia", {2025: ("=2", 90.0), 2026: ("=2", 91.0)}),
+    (3, "Gamma University", "China", "Asia", {2025: ("=2", 90.0), 2026: ("=2", 91.0)}),
+    (4, "Delta University", "Germany", "Europe", {2025: ("4", 80.0), 2026: ("4", 82.0)}),
+    (5, "Epsilon College", "Japan", "Asia", {2026: ("5", 70.0)}),
+    (6, "Zeta University", "Germany", "Europe", {2025: ("601-650", 30.0), 2026: ("601-650", 31.0)}),
+    (7, "Eta University", "China", "Asia", {2025: ("601-650", None), 2026: ("601-650", 29.0)}),
+    (8, "Theta University", "Japan", "Asia", {2025: ("651-700", 25.0), 2026: ("651-700", 26.0)}),
+    (9, "Iota University", "Germany", "Europe", {2026: ("1201+", 10.0)}),
+    (10, "Kappa University", "China", "Asia", {2026: (None, None)}),
+]
+
+def make_frame():
+    rows = []
+    for univ_id, name, country, region, editions in UNIVERSITIES:
+        for year, (rank, total) in editions.items():
+            lo, hi, tied = importer.parse_rank(rank)
+            rows.append({
+                "id": len(rows) + 1, "UNIV_ID": univ_id, "NAME": name, "COUNTRY": country, "REGION": region,
+                "YEAR": year, "RANK": rank, "RANK_LO": lo, "RANK_HI": hi, "RANK_TIED": tied,
+                **{column: (None if total is None else total - index) for index, column in enumerate(qs_data.AGGREGATE_COLUMNS)}
+            })
+    frame = pd.DataFrame(rows).sort_values(["YEAR", "id"]).reset_index(drop=True)
+    return frame.astype({"RANK_LO": "Int32", "RANK_HI": "Int32", **{column: "float64" for column in qs_data.AGGREGATE_COLUMNS}})
+
+@pytest.fixture
+def dataset():
+    return qs_data.QSDataset("test", make_frame())
+
+def test_memoized_queries_accept_keyword_arguments(dataset):
+    positional = dataset.filter_by(2026, None, ("Japan",))
+    assert dataset.filter_by(2026, countries=["Japan"]) is positional
+    assert dataset.filter_by(year=2026, regions=None, countries=("Japan",)) is positional
+    assert positional["UNIV_ID"].tolist() == [1, 2, 5, 8]
+    assert dataset.filter_by(2026, regions=["Europe"])["UNIV_ID"].tolist() == [4, 6, 9]
+    assert dataset.search_names("university", limit=2) == dataset.search_names("university", 2)
+
+def test_page_rows_reads_rank_ordered_pages_without_sorting(dataset, monkeypatch):
+    part = dataset.filter_by(2026)
+    expected = part.sort_values("RANK_LO", na_position="last", kind="stable")
+    assert qs_data.page_rows(part, "RANK_LO", True, 2, 4)["UNIV_ID"].tolist() == expected["UNIV_ID"].iloc[4:8].tolist()
+    assert qs_data.page_rows(part, "RANK_LO", False, 1, 3)["UNIV_ID"].tolist() == [9, 8, 6]
+
+    def no_sort(*args, **kwargs):
+        raise AssertionError("rank-ordered frame was re-sorted")
+    monkeypatch.setattr(pd.DataFrame, "sort_values", no_sort)
+    page = qs_data.page_rows(part, "RANK_LO", True, 2, 4, rank_ordered=True)
+    assert page["UNIV_ID"].tolist() == expected["UNIV_ID"].iloc[4:8].tolist()
+
+NAMES = {
+    1: "University of Oxford",
+    2: "Oxford Brookes University",
+    3: "Tsinghua University",
+    4: "University of Birmingham",
+    5: "Yale University",
+    6: "Università Vita-Salute San Raffaele",
+    7: "Binghamton University SUNY",
+    8: "Columbia University",
+    9: "University of British Columbia",
+    10: "University of Missouri, Columbia",
+    11: "Nanjing University",
+    12: "The University of Tokyo",
+    13: "Peking University",
+    14: "Deakin University",
+    15: "Washington University in St. Louis",
+    16: "Massachusetts Institute of Technology (MIT)",
+    17: "Nanjing Agricultural University",
+    18: "Tokyo University of Science",
+    19: "Tokai University",
+    20: "Shanghai University",
+    21: "Shanghai Jiao Tong University",
+    22: "Xi'an Jiaotong University",
+    23: "Beijing Jiaotong University",
+    24: "University of California, Berkeley (UCB)",
+    25: "University of Southern California",
+    26: "University of Wisconsin-Madison",
+    27: "University of Illinois at Urbana-Champaign",
+}
+
+@pytest.fixture
+def name_index():
+    # Names plus the importer's short-name and acronym aliases
+    terms = {(univ_id, term) for univ_id, name in NAMES.items() for term in importer.name_aliases(name)}
+    return qs_data.NameIndex(sorted(terms), NAMES)
+
+def search_ids(name_index, text, limit=5):
+    return [match.univ_id for match in name_index.search(text, limit)]
+
+def test_name_index_ranks_substring_matches(name_index):
+    # Prefix matches first, then earlier matches, then shorter names
+    assert search_ids(name_index, "oxford") == [2, 1]
+    assert search_ids(name_index, "columbia") == [8, 9, 10]
+    assert search_ids(name_index, "university of", 3) == [1, 4, 9]
+    assert search_ids(name_index, "MIT") == [16]
+
+def test_name_index_folds_case_and_accents(name_index):
+    assert search_ids(name_index, "UNIVERSITA VITA") == [6]
+    assert search_ids(name_index, "  tsinghua   university ") == [3]
+
+@pytest.mark.parametrize("text, univ_id", [
+    ("Oxfrod", 1),
+    ("Tsinghau", 3),
+    ("Yael", 5),
+    ("Columbia Universtiy", 8),
+    ("Nanjing Univresity", 11),
+    ("Univercity of Tokio", 12),
+    ("Pekin University", 13),
+    ("Massachusets Institute", 16),
+])
+def test_name_index_resolves_typos(name_index, text, univ_id):
+    # A misspelled name resolves to the one university it names; names with words the input
+    # leaves out ('University of British Columbia') rank below it
+    assert name_index.resolve(text).univ_id == univ_id
+    assert search_ids(name_index, text)[0] == univ_id
+
+@pytest.mark.parametrize("text, unrelated", [
+    ("Tsinghau", [4, 7]),
+    ("Pekin University", [14, 15]),
+    ("Yael", [6]),
+    ("Univercity of Tokio", [19]),
+])
+def test_name_index_leaves_out_weak_matches(name_index, text, unrelated):
+    assert not set(search_ids(name_index, text, 10)) & set(unrelated)
+
+def test_name_index_fuzzy_needs_the_typed_words(name_index):
+    # A rare typed word missing from a name rules it out, and nonsense matches nothing
+    assert 20 not in search_ids(name_index, "Shanghai Jiaotong University", 10)
+    assert name_index.search("xyzzy") == []
+
+def test_name_index_resolves_only_unambiguous_input(name_index):
+    # Several universities contain 'oxford' or 'columbia'; a full name or alias picks one
+    assert name_index.resolve("oxford") is None
+    assert name_index.resolve("columbia") is None
+    assert name_index.resolve("University of Oxford").univ_id == 1
+    assert name_index.resolve("MIT").univ_id == 16
+    # Restricted to other universities, the one left matching the input is picked, but an exact
+    # name still only names its own university
+    assert name_index.resolve("oxford", {2, 3}).univ_id == 2
+    assert name_index.resolve("University of Oxford", {2, 3}) is None
+    assert name_index.resolve("MIT", {1, 2}) is None
+
+def test_dataset_resolves_names_against_a_year(dataset):
+    assert dataset.resolve("Epsilon").univ_id == 5
+    assert dataset.resolve("Epsilon", 2026).univ_id == 5
+    assert dataset.resolve("Epsilon", 2025) is None
+    assert dataset.resolve("Kapa University", 2026).univ_id == 10
+    assert dataset.resolve("Kapa University", 2025) is None
+    assert dataset.resolve("university") is None
+    matches = dataset.resolve_many(("alpha", "9", " ", "zzz", "Theta University"), 2026)
+    assert [match and match.univ_id for match in matches] == [1, 9, None, None, 8]
+
+@pytest.mark.parametrize("year, start_rank, end_rank, univ_ids", [
+    (2026, 1, 3, [1, 2, 3]),
+    (2026, 2, 2, [2, 3]),
+    (2026, 600, 610, [6, 7]),
+    (2026, 650, 651, [6, 7, 8]),
+    (2026, 701, 1200, []),
+    (2026, 700, 1300, [8, 9]),
+    (2026, 5000, 6000, [9]),
+    (2025, 1, 1000, [1, 2, 3, 4, 6, 7, 8]),
+    (2024, 1, 10, []),
+])
+def test_rank_window_peers_include_overlapping_bands(dataset, year, start_rank, end_rank, univ_ids):
+    # A band (601-650) belongs to every window it overlaps, 1201+ to every window from 1201 on
+    peers = dataset.rank_window_peers(year, start_rank, end_rank)
+    assert peers["UNIV_ID"].tolist() == univ_ids
+    part = dataset.year_frame(year)
+    lo = part["RANK_LO"].to_numpy("float64", na_value=np.inf)
+    hi = part["RANK_HI"].to_numpy("float64", na_value=np.inf)
+    assert peers["UNIV_ID"].tolist() == part["UNIV_ID"][(lo <= end_rank) & (hi >= start_rank)].tolist()
+
+def assert_aggregate(aggregate, rows):
+    # aggregate matches the per-column statistics of rows, ignoring missing scores
+    scores = rows[qs_data.AGGREGATE_COLUMNS]
+    assert aggregate.count == len(rows)
+    for field, expected in [("mean", scores.mean()), ("min", scores.min()), ("p25", scores.quantile(0.25)),
+                            ("median", scores.median()), ("p75", scores.quantile(0.75)), ("max", scores.max())]:
+        pd.testing.assert_series_equal(getattr(aggregate, field), expected, check_names=False)
+
+@pytest.mark.parametrize("year, start_rank, end_rank", [
+    (2026, 1, 10), (2026, 2, 2), (2026, 600, 700), (2025, 600, 700), (2026, 1, 2000), (2026, 701, 1200),
+])
+def test_rank_group_aggregate_matches_rows(dataset, year, start_rank, end_rank):
+    aggregate = dataset.group_aggregate(year, ("rank", start_rank, end_rank))
+    assert_aggregate(aggregate, dataset.rank_window_peers(year, start_rank, end_rank))
+    if year == 2025 and start_rank == 600:
+        # Eta University has no 2025 total score: counted, but left out of the statistics
+        assert aggregate.count == 3
+        assert aggregate.mean["TOTAL_SCORE"] == np.mean([30.0, 25.0])
+
+@pytest.mark.parametrize("year, regions, countries", [
+    (2026, None, ()), (2026, ["Asia"], ()), (2026, None, ["Japan", "Germany"]), (2026, ["Europe"], ["Japan"]),
+    (2025, None, ["China"]), (2025, ["Asia"], ["China", "Japan"]), (2024, None, ()),
+])
+def test_filter_summary_matches_filter_by(dataset, year, regions, countries):
+    rows = dataset.filter_by(year, regions, countries)
+    summary = dataset.filter_summary(year, regions, countries)
+    assert summary.count == len(rows)
+    if rows["TOTAL_SCORE"].notna().any():
+        assert summary.mean_total_score == pytest.approx(rows["TOTAL_SCORE"].mean())
+    else:
+        assert summary.mean_total_score is None
+
+@pytest.mark.parametrize("year, group", [
+    (2026, ("country", "Japan")), (2025, ("country", "China")), (2026, ("region", "Europe")),
+    (2026, ("country", "Japan", "Germany")), (2026, ("country", "France")),
+])
+def test_group_statistics_match_rows(dataset, year, group):
+    # Single countries and regions are read from the precomputed statistics
+    assert_aggregate(dataset.group_aggregate(year, group), dataset.group_peers(year, group))
+
+@pytest.mark.parametrize("year, group, univ_ids", [
+    (2026, ("neighbors", 4, 2), [2, 3, 5, 6]),
+    (2026, ("neighbors", 1, 2), [2, 3]),
+    (2026, ("neighbors", 9, 1), [8]),
+    (2026, ("neighbors", 10, 1), []),
+    (2025, ("neighbors", 5, 1), []),
+    (2026, ("country_top", "Japan", 5), [1, 2, 5]),
+    (2026, ("country_top", "Japan", 650), [1, 2, 5]),
+    (2026, ("country_top", "China", 700), [3, 7]),
+    (2026, ("country_top", "Germany", 2000), [4, 6, 9]),
+    (2026, ("country_top", "China", 1), []),
+    (2026, ("country_top", "France", 100), []),
+])
+def test_benchmark_groups(dataset, year, group, univ_ids):
+    # Rank neighbours leave out the university itself and unranked ones; a country's top universities
+    # are those whose (lower) rank is within max_rank
+    peers = dataset.group_peers(year, group)
+    assert peers["UNIV_ID"].tolist() == univ_ids
+    assert_aggregate(dataset.group_aggregate(year, group), peers)